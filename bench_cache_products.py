@@ -0,0 +1,68 @@
+# Бенчмарк загрузки каталога в redis: поштучные HSET против pipeline пачками
+# Запуск: python bench_cache_products.py [размеры каталога через пробел]
+# Нужен локальный redis, используется отдельная база 15, она очищается перед каждым прогоном
+import asyncio
+import sys
+import time
+
+import redis.asyncio as redis
+
+import redis_nikix
+from product_model import Product
+
+SIZES = [100, 1000, 5000, 10000, 50000]
+CHUNK_SIZES = [100, 500, 2000]
+BRANDS = ["Nike", "Adidas", "New Balance", "Asics", "Hoka", "Salomon", "Puma", "Vans"]
+SEASONS = ["демисезон", "лето", "зима", "демисезон, лето", "демисезон, зима"]
+
+
+def make_products(count):
+    return [Product(id=i, type="sneaker", name=f"Sneaker model {i}", maker="Китай", material="кожа, замша",
+                    season=SEASONS[i % len(SEASONS)], brand=BRANDS[i % len(BRANDS)], price=10000 + i,
+                    art=f"ART{i:06d}", photo_url=f"https://example.com/{i}.jpg", channel_url="0",
+                    anki_url=f"https://anki.team/product/{i}", is_drop=0, drop_price=0)
+            for i in range(1, count + 1)]
+
+
+# Старая реализация: по одному await на каждую команду
+async def cache_products_sequential(products):
+    client = redis_nikix.redis_client
+    unique_brands = set()
+    for product in products:
+        product_key = f"product:{product.brand}:{product.art}"
+        await client.hset(product_key, mapping=product._asdict())
+        unique_brands.add(product.brand)
+        for season in product.season.split(", "):
+            await client.hset(f"season:{season}:{product.art}", mapping=product._asdict())
+    await client.delete("brands")
+    await client.rpush("brands", *sorted(unique_brands))
+
+
+async def measure(func, products):
+    await redis_nikix.redis_client.flushdb()
+    start = time.perf_counter()
+    await func(products)
+    return time.perf_counter() - start
+
+
+async def main(sizes):
+    redis_nikix.redis_client = redis.Redis(host='localhost', port=6379, db=15)
+    header = f"{'товаров':>8} | {'поштучно, с':>12} | " + " | ".join(f"{f'pipeline {c}, с':>16}" for c in CHUNK_SIZES)
+    print(header)
+    print("-" * len(header))
+    for count in sizes:
+        products = make_products(count)
+        sequential = await measure(cache_products_sequential, products)
+        row = f"{count:>8} | {sequential:>12.3f} | "
+        results = []
+        for chunk_size in CHUNK_SIZES:
+            elapsed = await measure(lambda p: redis_nikix.cache_products(p, chunk_size=chunk_size), products)
+            results.append(f"{elapsed:>16.3f}")
+        print(row + " | ".join(results))
+    await redis_nikix.redis_client.flushdb()
+    await redis_nikix.redis_client.aclose()
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    asyncio.run(main(sizes))
@@ -0,0 +1,98 @@
+# Товар в redis: хэш с полем на каждый атрибут против одной строки product_model.Product.to_blob
+# Запуск: python bench_catalog_blob.py [количество товаров]
+# Считается память redis на товар, байты ответа на один клик (товар по позиции), CPU на разбор ответа,
+# время клика и загрузки всего каталога (как в catalog_engine.reload).
+# Нужен локальный redis, используется отдельная база 15, она очищается перед прогоном
+import asyncio
+import sys
+import time
+
+import redis.asyncio as redis
+
+import product_model
+from bench_product import dict_from_redis, make_rows, product_from_redis
+
+COUNT = 2000
+CLICKS = 2000
+
+
+# Размер ответа в протоколе RESP2: HGETALL - массив из имён и значений полей, GET - одна строка
+def bulk_size(value):
+    return len(f"${len(value)}\r\n") + len(value) + 2
+
+
+def hgetall_size(data):
+    return len(f"*{len(data) * 2}\r\n") + sum(bulk_size(key) + bulk_size(value) for key, value in data.items())
+
+
+def per_item(func, items, rounds=20):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (rounds * len(items)) * 1e6
+
+
+async def clicks(client, keys, read, decode):
+    start = time.perf_counter()
+    for i in range(CLICKS):
+        decode(await read(keys[i % len(keys)]))
+    return (time.perf_counter() - start) / CLICKS * 1e6
+
+
+async def main(count):
+    client = redis.Redis(host='localhost', port=6379, db=15)
+    await client.flushdb()
+    products = [product_model.from_row(row) for row in make_rows(count)]
+    hash_keys = [f"hash:{product.art}" for product in products]
+    blob_keys = [f"blob:{product.art}" for product in products]
+    async with client.pipeline(transaction=False) as pipe:
+        for product, hash_key, blob_key in zip(products, hash_keys, blob_keys):
+            pipe.hset(hash_key, mapping=product._asdict())
+            pipe.set(blob_key, product.to_blob())
+        await pipe.execute()
+
+    async with client.pipeline(transaction=False) as pipe:
+        for key in hash_keys + blob_keys:
+            pipe.memory_usage(key, samples=0)
+        usage = await pipe.execute()
+    async with client.pipeline(transaction=False) as pipe:
+        for key in hash_keys:
+            pipe.hgetall(key)
+        hashes = await pipe.execute()
+    blobs = await client.mget(blob_keys)
+    assert [product_model.from_blob(blob) for blob in blobs] == [product_from_redis(data) for data in hashes]
+
+    results = {"хэш": {}, "строка": {}}
+    results["хэш"]["память redis, байт/товар"] = sum(usage[:count]) / count
+    results["строка"]["память redis, байт/товар"] = sum(usage[count:]) / count
+    results["хэш"]["ответ на клик, байт"] = sum(hgetall_size(data) for data in hashes) / count
+    results["строка"]["ответ на клик, байт"] = sum(bulk_size(blob) for blob in blobs) / count
+    results["хэш"]["разбор, мкс (dict)"] = per_item(dict_from_redis, hashes)
+    results["хэш"]["разбор, мкс (Product)"] = per_item(product_from_redis, hashes)
+    results["строка"]["разбор, мкс (Product)"] = per_item(product_model.from_blob, blobs)
+    results["хэш"]["клик, мкс"] = await clicks(client, hash_keys, client.hgetall, product_from_redis)
+    results["строка"]["клик, мкс"] = await clicks(client, blob_keys, client.get, product_model.from_blob)
+
+    start = time.perf_counter()
+    async with client.pipeline(transaction=False) as pipe:
+        for key in hash_keys:
+            pipe.hgetall(key)
+        [product_from_redis(data) for data in await pipe.execute()]
+    results["хэш"]["весь каталог, мс"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    [product_model.from_blob(blob) for blob in await client.mget(blob_keys)]
+    results["строка"]["весь каталог, мс"] = (time.perf_counter() - start) * 1000
+    await client.flushdb()
+
+    print(f"Товаров: {count}\n")
+    header = f"{'':<28} | {'хэш':>10} | {'строка':>10}"
+    print(header)
+    print("-" * len(header))
+    for name in results["хэш"] | results["строка"]:
+        cells = [f"{results[kind][name]:>10.2f}" if name in results[kind] else f"{'—':>10}" for kind in ("хэш", "строка")]
+        print(f"{name:<28} | " + " | ".join(cells))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT))
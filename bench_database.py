@@ -0,0 +1,95 @@
+# Бенчмарк задержки вызовов database.py: новое соединение на каждый вызов против постоянных соединений (open_db)
+# Запуск: python bench_database.py [количество вызовов]
+# База создаётся во временной папке, рабочая nikix_bot_database.db не трогается
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# database импортирует main, а main читает настройки бота из окружения
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("CHAT_ORDERS_ID", "0")
+
+import aiosqlite
+
+import database
+
+CALLS = 500
+PRODUCTS = 2000
+USERS = 200
+
+
+async def fill_database():
+    await database.init_db()
+    async with aiosqlite.connect(database.DATABASE_PATH) as db:
+        await db.executemany(
+            "INSERT INTO products (type, name, maker, material, season, brand, price, art, photo_url, channel_url, anki_url, is_drop, drop_price) "
+            "VALUES ('sneaker', ?, 'Китай', 'кожа', 'лето', 'Nike', ?, ?, 'p', '0', 'u', 0, 0)",
+            [(f"Sneaker {i}", 10000 + i, f"ART{i}") for i in range(PRODUCTS)])
+        await db.executemany("INSERT INTO basket (user_id, art, size) VALUES (?, ?, '42')",
+                             [(user_id, f"ART{(user_id * 7 + j) % PRODUCTS}") for user_id in range(USERS) for j in range(3)])
+        await db.commit()
+
+
+async def read_basket(i):
+    await database.fetch_basket(user_id=i % USERS, count=True)
+
+
+async def read_product(i):
+    await database.fetch_product_by_art(f"ART{i % PRODUCTS}")
+
+
+async def write_basket(i):
+    await database.add_to_basket(user_id=USERS + 1, art=f"ART{i % PRODUCTS}", size="43")
+    await database.clear_basket(user_id=USERS + 1, basket_id=0, is_all=1)
+
+
+OPERATIONS = [("fetch_basket(count)", read_basket), ("fetch_product_by_art", read_product),
+              ("add_to_basket + clear_basket", write_basket)]
+
+
+async def sequential(operation, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        await operation(i)
+    return (time.perf_counter() - start) / calls * 1000
+
+
+# Без общего соединения параллельные записи упираются в блокировку файла, такие ошибки считаем, а не падаем
+async def concurrent(operation, calls):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(operation(i) for i in range(calls)), return_exceptions=True)
+    return time.perf_counter() - start, sum(isinstance(result, Exception) for result in results)
+
+
+async def run(calls):
+    results = {}
+    for name, operation in OPERATIONS:
+        results[name] = (await sequential(operation, calls), await concurrent(operation, calls))
+    return results
+
+
+async def main(calls):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = os.path.join(tmp, "bench.db")
+        await fill_database()
+        before = await run(calls)
+        await database.open_db()
+        after = await run(calls)
+        await database.close_db()
+
+    header = (f"{'операция':<30} | {'мс/вызов до':>12} | {'мс/вызов после':>15} | "
+              f"{f'{calls} параллельно до, с':>24} | {'ошибок':>6} | {'после, с':>9} | {'ошибок':>6}")
+    print(header)
+    print("-" * len(header))
+    for name, _ in OPERATIONS:
+        (latency_before, (elapsed_before, errors_before)), (latency_after, (elapsed_after, errors_after)) = before[name], after[name]
+        print(f"{name:<30} | {latency_before:>12.3f} | {latency_after:>15.3f} | "
+              f"{elapsed_before:>24.3f} | {errors_before:>6} | {elapsed_after:>9.3f} | {errors_after:>6}")
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+    asyncio.run(main(calls))
@@ -0,0 +1,139 @@
+# Микробенчмарк разбора страницы товара: исходный get_sizes против вариантов parserAnki.EXTRACTORS
+# Запуск: python bench_extract.py [папка с сохранёнными страницами anki (*.html)]
+# Кроме сохранённых страниц всегда проверяется набор сгенерированных с разными краевыми случаями.
+# Если хоть один вариант разошёлся с исходным, выводится страница и скрипт завершается с кодом 1
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+import parserAnki
+
+ROUNDS = 20
+SIZES = ["36", "36 2/3", "37 1/3", "38", "38 2/3", "39 1/3", "40", "40 2/3", "41 1/3", "42", "42 2/3", "43 1/3",
+         "44", "44 2/3", "45 1/3", "46", "46 2/3", "47 1/3", "48", "48 2/3"]
+
+
+# Исходная реализация разбора из get_sizes, эталон для сравнения
+def extract_sizes_original(html):
+    soup = BeautifulSoup(html, "html.parser")
+    inputs = soup.find_all('input', {'type': 'radio'})
+    available_sizes = []
+    for input_tag in inputs:
+        if not input_tag.has_attr('disabled'):
+            label = soup.find('label', {'for': input_tag['id']})
+            if label:
+                spans = label.find_all('span')
+                if spans:
+                    size_parts = [span.text.strip() for span in spans]
+                    full_size = ' '.join(size_parts)
+                    full_size = re.sub(r'\s+', ' ', full_size).strip()
+                    if re.search(r'\d', full_size):
+                        available_sizes.append(full_size)
+    return available_sizes
+
+
+# Обвязка страницы: шапка, меню, описание, похожие товары - как у настоящей, чтобы объём был похожий
+def wrap_page(sizes_block, filler=40):
+    menu = "".join(f"<li><a href='/catalog/{i}'><span>Раздел {i}</span></a></li>" for i in range(filler))
+    related = "".join(f"<div class='card'><img src='/img/{i}.jpg'><span class='price'>{10000 + i} ₽</span>"
+                      f"<label class='fav'><span>В избранное</span></label></div>" for i in range(filler))
+    return ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Товар</title>"
+            "<script>var sizes = '<label for=\"x\"><span>99</span></label>';</script></head><body>"
+            f"<header><ul>{menu}</ul></header><main><h1>Кроссовки</h1><p>Описание &amp; уход</p>"
+            f"<form class='sizes'>{sizes_block}</form></main><section>{related}</section></body></html>")
+
+
+def size_input(i, size, disabled=False, label=None):
+    label = label if label is not None else f"<span>{size}</span> <span>EU</span>"
+    return (f'<input type="radio" name="size" id="size-{i}" value="{i}"{" disabled" if disabled else ""}>'
+            f'<label for="size-{i}" class="size">{label}</label>')
+
+
+def make_corpus():
+    pages = {}
+    for count in (1, 5, 10, 20):
+        for step in (2, 3, 5):
+            block = "".join(size_input(i, SIZES[i], disabled=i % step == 0) for i in range(count))
+            pages[f"sizes-{count}-every{step}-disabled"] = wrap_page(block)
+    pages["all-disabled"] = wrap_page("".join(size_input(i, SIZES[i], disabled=True) for i in range(10)))
+    pages["no-sizes"] = wrap_page("<p>Нет в наличии</p>")
+    pages["empty"] = ""
+    pages["labels-before-inputs"] = wrap_page(
+        "".join(f'<label for="size-{i}"><span>{SIZES[i]}</span></label>' for i in range(8))
+        + "".join(f'<input type="radio" name="size" id="size-{i}">' for i in range(8)))
+    pages["missing-labels"] = wrap_page("".join(size_input(i, SIZES[i]) if i % 2 else
+                                                f'<input type="radio" name="size" id="size-{i}">' for i in range(10)))
+    pages["label-without-spans"] = wrap_page("".join(size_input(i, SIZES[i], label=f"{SIZES[i]} EU") for i in range(6)))
+    pages["no-digits"] = wrap_page(size_input(0, "", label="<span>One size</span>") + size_input(1, "42"))
+    pages["whitespace-and-entities"] = wrap_page("".join(
+        size_input(i, SIZES[i], label=f"\n  <span>\n {SIZES[i].replace(' ', '&nbsp;')}  </span>\t<span> EU&nbsp;</span>\n")
+        for i in range(8)))
+    pages["nested-spans"] = wrap_page("".join(
+        size_input(i, SIZES[i], label=f"<span><span>{SIZES[i]}</span> <span>US {i + 4}</span></span>") for i in range(8)))
+    pages["unclosed-span"] = wrap_page("".join(size_input(i, SIZES[i], label=f"<span>{SIZES[i]}") for i in range(5)))
+    pages["duplicate-labels"] = wrap_page("".join(size_input(i, SIZES[i]) for i in range(5))
+                                          + '<label for="size-1"><span>99</span></label>')
+    pages["other-inputs"] = wrap_page('<input type="checkbox" id="c1"><label for="c1"><span>1 шт</span></label>'
+                                      '<input type="radio" id="r1" disabled><input type="text" id="t1">'
+                                      + "".join(size_input(i, SIZES[i]) for i in range(5)))
+    pages["big-page"] = wrap_page("".join(size_input(i, SIZES[i], disabled=i % 4 == 0) for i in range(20)), filler=400)
+    return pages
+
+
+def load_saved(folder):
+    pages = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".html"):
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                pages[name] = f.read()
+    return pages
+
+
+def run(extractor, html):
+    try:
+        return extractor(html)
+    except Exception as e:
+        return f"ошибка {type(e).__name__}" # в get_sizes любая ошибка превращается в -1, сравниваем по типу
+
+
+def main(folder=None):
+    pages = make_corpus()
+    if folder:
+        pages.update(load_saved(folder))
+    extractors = {"исходный": extract_sizes_original}
+    extractors.update(parserAnki.EXTRACTORS)
+
+    mismatches = 0
+    for name, html in pages.items():
+        expected = run(extract_sizes_original, html)
+        for backend, extractor in parserAnki.EXTRACTORS.items():
+            result = run(extractor, html)
+            if result != expected:
+                mismatches += 1
+                print(f"Расхождение {backend} на {name}: {result} вместо {expected}")
+    print(f"Страниц: {len(pages)}, вариантов: {len(parserAnki.EXTRACTORS)}, расхождений: {mismatches}\n")
+
+    header = f"{'вариант':<10} | {'мс на страницу':>14} | {'мс на big-page':>14} | {'ускорение':>9}"
+    print(header)
+    print("-" * len(header))
+    baseline = None
+    for backend, extractor in extractors.items():
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for html in pages.values():
+                run(extractor, html)
+        per_page = (time.perf_counter() - start) / (ROUNDS * len(pages)) * 1000
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            run(extractor, pages["big-page"])
+        big_page = (time.perf_counter() - start) / ROUNDS * 1000
+        baseline = baseline or per_page
+        print(f"{backend:<10} | {per_page:>14.3f} | {big_page:>14.3f} | {baseline / per_page:>8.1f}x")
+    return mismatches
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main(sys.argv[1] if len(sys.argv) > 1 else None) else 0)
@@ -0,0 +1,94 @@
+# Задержка цикла событий во время полного обновления размеров: разбор страниц в цикле против parserAnki.parse_pool
+# Запуск: python bench_loop_lag.py [количество ссылок]
+# Пока идёт get_all_sizes, рядом крутится задача, которая просыпается каждые LAG_INTERVAL секунд и записывает,
+# на сколько она опоздала. Так же опаздывали бы ответы покупателям в боте
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+import bench_extract
+import parserAnki
+from bench_parser import wait_stub
+
+URLS = 1000
+LAG_INTERVAL = 0.01
+STUB_LATENCY = 0.05
+# (название, разбор, в пуле процессов)
+CONFIGS = [("bs4 в цикле", "bs4", False), ("bs4 в пуле", "bs4", True),
+           ("lxml в цикле", "lxml", False), ("lxml в пуле", "lxml", True)]
+
+
+def run_stub(port):
+    pages = [bench_extract.wrap_page("".join(bench_extract.size_input(i, size, disabled=(i + n) % 3 == 0)
+                                             for i, size in enumerate(bench_extract.SIZES))) for n in range(3)]
+
+    async def handler(request):
+        await asyncio.sleep(STUB_LATENCY)
+        return web.Response(text=pages[int(request.match_info["number"]) % 3], content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/product/{number}", handler)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, backlog=4096)
+
+
+async def watch_lag(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(loop.time() - start - LAG_INTERVAL)
+
+
+async def measure(urls, extractor, use_pool):
+    parserAnki.pages_state.clear() # иначе страницы с прошлого прогона не будут разбираться заново
+    if use_pool:
+        parserAnki.start_parse_pool()
+        await parserAnki.parse_pages([("warmup", "")]) # процессы запускаются заранее, как в on_startup
+    lags = []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_lag(lags, stop))
+    start = time.perf_counter()
+    sizes = await parserAnki.get_all_sizes(urls, concurrency=50, per_host=50, rate=0, extractor=extractor)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+    parserAnki.stop_parse_pool()
+    lags = sorted(lag * 1000 for lag in lags)
+    errors = sum(1 for value in sizes.values() if value == -1)
+    return elapsed, statistics.mean(lags), lags[int(len(lags) * 0.99)], lags[-1], errors
+
+
+async def main(count, port):
+    await wait_stub(port)
+    urls = [{"art": f"ART{i}", "url": f"http://127.0.0.1:{port}/product/{i}"} for i in range(count)]
+    header = f"{'вариант':<14} | {'время, с':>8} | {'задержка ср, мс':>15} | {'p99, мс':>8} | {'макс, мс':>8} | {'ошибок':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, extractor, use_pool in CONFIGS:
+        elapsed, mean, p99, worst, errors = await measure(urls, extractor, use_pool)
+        print(f"{name:<14} | {elapsed:>8.2f} | {mean:>15.2f} | {p99:>8.2f} | {worst:>8.2f} | {errors:>6}")
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else URLS
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    stub = multiprocessing.Process(target=run_stub, args=(port,), daemon=True)
+    stub.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        with open("bot_settings.json", "w") as f:
+            json.dump({"proxy": None}, f)
+        try:
+            asyncio.run(main(count, port))
+        finally:
+            stub.terminate()
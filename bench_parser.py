@@ -0,0 +1,103 @@
+# Бенчмарк парсинга размеров: старый последовательный обход против parserAnki.get_all_sizes с параллельными запросами
+# Запуск: python bench_parser.py [количество ссылок через пробел]
+# Страницы отдаёт локальная заглушка в отдельном процессе, каждая с задержкой STUB_LATENCY, как у настоящего сайта
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+import parserAnki
+
+SIZES = [100, 1000, 10000]
+SEQUENTIAL_LIMIT = 1000 # последовательно больше не гоняем, слишком долго
+STUB_LATENCY = 0.05
+# (название, concurrency, per_host, запросов в секунду)
+CONFIGS = [("10 параллельно", 10, 10, 0), ("50 параллельно", 50, 50, 0), ("50 параллельно, 200 запр/с", 50, 50, 200)]
+
+
+# Страница товара в разметке anki: radio на каждый размер, у проданных disabled
+def make_page(number):
+    sizes = ["40", "40 2/3", "41 1/3", "42", "42 2/3", "43 1/3", "44", "44 2/3", "45 1/3", "46"]
+    body = []
+    for i, size in enumerate(sizes):
+        disabled = " disabled" if (number + i) % 3 == 0 else ""
+        body.append(f'<input type="radio" name="size" id="size-{i}" value="{i}"{disabled}>'
+                    f'<label for="size-{i}"><span>{size}</span> <span>EU</span></label>')
+    return ("<html><head><title>Товар</title></head><body><div class='product'>"
+            + "<p>Описание товара</p>" * 20 + "".join(body) + "</div></body></html>")
+
+
+def run_stub(port):
+    async def handler(request):
+        await asyncio.sleep(STUB_LATENCY)
+        return web.Response(text=make_page(int(request.match_info["number"])), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/product/{number}", handler)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, backlog=4096)
+
+
+# Старая реализация: одна страница за другой
+async def get_all_sizes_sequential(urls):
+    all_sizes = {}
+    async with aiohttp.ClientSession() as session:
+        for sneaker in urls:
+            all_sizes[sneaker["art"]] = await parserAnki.get_sizes(session=session, url=sneaker["url"], proxy=None)
+    return all_sizes
+
+
+async def wait_stub(port):
+    for _ in range(100):
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/product/1"):
+                    return
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.1)
+
+
+async def measure(func, urls):
+    parserAnki.pages_state.clear() # иначе страницы с прошлого прогона не будут разбираться заново
+    start = time.perf_counter()
+    sizes = await func(urls)
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for value in sizes.values() if value == -1)
+    return f"{elapsed:>8.2f} с {len(urls) / elapsed:>7.1f}/с" + (f" ошибок {errors}" if errors else "")
+
+
+async def main(sizes, port):
+    await wait_stub(port)
+    header = f"{'ссылок':>7} | {'последовательно':>22} | " + " | ".join(f"{name:>26}" for name, *_ in CONFIGS)
+    print(header)
+    print("-" * len(header))
+    for count in sizes:
+        urls = [{"art": f"ART{i}", "url": f"http://127.0.0.1:{port}/product/{i}"} for i in range(count)]
+        row = [await measure(get_all_sizes_sequential, urls) if count <= SEQUENTIAL_LIMIT else "—"]
+        for _, concurrency, per_host, rate in CONFIGS:
+            row.append(await measure(lambda u: parserAnki.get_all_sizes(u, concurrency=concurrency, per_host=per_host, rate=rate), urls))
+        print(f"{count:>7} | {row[0]:>22} | " + " | ".join(f"{cell:>26}" for cell in row[1:]))
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    stub = multiprocessing.Process(target=run_stub, args=(port,), daemon=True)
+    stub.start()
+    # get_all_sizes берёт прокси из bot_settings.json, поэтому работаем во временной папке без прокси
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        with open("bot_settings.json", "w") as f:
+            json.dump({"proxy": None}, f)
+        try:
+            asyncio.run(main(sizes, port))
+        finally:
+            stub.terminate()
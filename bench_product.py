@@ -0,0 +1,86 @@
+# Товар словарём против product_model.Product: память на каталог, сборка из строки sqlite и из хэша redis,
+# чтение поля. Запуск: python bench_product.py [количество товаров]
+# Строки и хэши генерируются в памяти, база и redis не нужны
+import sys
+import time
+import tracemalloc
+
+import product_model
+
+COUNT = 5000
+ROUNDS = 20
+
+
+def make_rows(count):
+    return [(i, "sneaker", f"Sneaker model {i}", "Китай", "кожа, замша", "демисезон, лето", f"Brand{i % 20}",
+             10000 + i, f"ART{i:06d}", f"https://example.com/{i}.jpg", "0", f"https://anki.team/product/{i}", i % 2, 0)
+            for i in range(1, count + 1)]
+
+
+def make_hashes(rows):
+    return [{field.encode(): str(value).encode() for field, value in zip(product_model.FIELDS, row)} for row in rows]
+
+
+# Старые реализации: database.fetch_products и redis_nikix.decode_product
+def dict_from_row(row):
+    return {"id": row[0], "type": row[1], "name": row[2], "maker": row[3], "material": row[4], "season": row[5],
+            "brand": row[6], "price": row[7], "art": row[8], "photo_url": row[9], "channel_url": row[10],
+            "anki_url": row[11], "is_drop": row[12], "drop_price": row[13]}
+
+
+def dict_from_redis(product):
+    product = {k.decode('utf-8'): v.decode('utf-8') for k, v in product.items()}
+    product["id"] = int(product["id"])
+    product["price"] = int(product["price"])
+    product["drop_price"] = int(product["drop_price"])
+    return product
+
+
+# Product из HGETALL - как товары читались бы, если бы в redis остались хэши (для сравнения со строкой to_blob)
+INT_FIELDS = ("id", "price", "is_drop", "drop_price")
+REDIS_FIELDS = [(field.encode("utf-8"), field in INT_FIELDS) for field in product_model.FIELDS]
+
+
+def product_from_redis(data):
+    return product_model.Product._make(int(data[key]) if is_int else data[key].decode("utf-8") for key, is_int in REDIS_FIELDS)
+
+
+def per_item(func, items):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (ROUNDS * len(items)) * 1e6
+
+
+def memory(func, items):
+    tracemalloc.start()
+    built = [func(item) for item in items]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    return size / len(items)
+
+
+def main(count):
+    rows = make_rows(count)
+    hashes = make_hashes(rows)
+    dicts = [dict_from_row(row) for row in rows]
+    products = [product_model.from_row(row) for row in rows]
+    assert all(product_from_redis(h) == product_model.from_row(r) for h, r in zip(hashes, rows))
+
+    header = f"{'':<22} | {'словарь':>10} | {'Product':>10}"
+    print(f"Товаров: {count}\n")
+    print(header)
+    print("-" * len(header))
+    print(f"{'память, байт/товар':<22} | {memory(dict_from_row, rows):>10.0f} | {memory(product_model.from_row, rows):>10.0f}")
+    print(f"{'из строки sqlite, мкс':<22} | {per_item(dict_from_row, rows):>10.3f} | {per_item(product_model.from_row, rows):>10.3f}")
+    print(f"{'из хэша redis, мкс':<22} | {per_item(dict_from_redis, hashes):>10.3f} | {per_item(product_from_redis, hashes):>10.3f}")
+    print(f"{'в хэш redis, мкс':<22} | {'—':>10} | {per_item(product_model.Product._asdict, products):>10.3f}")
+    label = "product['price'], мкс"
+    print(f"{label:<22} | {per_item(lambda p: p['price'], dicts):>10.3f} | {'—':>10}")
+    print(f"{'product.price, мкс':<22} | {'—':>10} | {per_item(lambda p: p.price, products):>10.3f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT)
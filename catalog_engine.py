@@ -0,0 +1,134 @@
+# Каталог в памяти процесса. Товаров от сотен до нескольких тысяч, поэтому весь текущий каталог из redis
+# держится здесь: записи (product_model.Product, неизменяемые) в одном списке (по id от новых к старым,
+# как индексы в redis) и готовые порядки для каждого бренда, сезона, типа и дропа - списки номеров записей.
+# Товар по позиции пользователя - это обращение к списку, без запросов в redis.
+# Каталог перечитывается целиком, только когда в redis меняется catalog_revision: об этом сообщают
+# через pub/sub (redis_nikix.announce_catalog_change), так что все процессы бота видят одно и то же
+import asyncio
+import logging
+
+import redis_nikix
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 5
+
+revision = None # версия, с которой собран каталог, None - ещё не загружен
+records = [] # товары по id от новых к старым
+positions = {} # артикул -> номер записи
+orderings = {} # (признак, значение) -> номера записей по порядку; ("brand", "all") - весь каталог
+ordering_positions = {} # (признак, значение) -> {номер записи: позиция в orderings}
+brands = []
+listener_task = None
+# Перечитывания идут по очереди: иначе медленная загрузка старой ревизии могла бы затереть уже загруженную новую
+reload_lock = asyncio.Lock()
+
+
+def build(products):
+    global records, positions, orderings, ordering_positions, brands
+    new_orderings = {("brand", "all"): list(range(len(products)))}
+    for number, product in enumerate(products):
+        for facet, value in redis_nikix.product_facets(product):
+            new_orderings.setdefault((facet, str(value)), []).append(number)
+    # порядок записей и индексов меняется одним присваиванием каждого, между ними нет await
+    records = products
+    positions = {product.art: number for number, product in enumerate(products)}
+    orderings = new_orderings
+    ordering_positions = {key: {number: position for position, number in enumerate(ordering)}
+                          for key, ordering in new_orderings.items()}
+    brands = sorted({product.brand for product in products})
+
+
+# Загрузить текущую версию каталога из redis. Номер ревизии читается до товаров: если каталог поменяется
+# во время загрузки, придёт новое сообщение и каталог перечитается ещё раз.
+# Ревизия не новее загруженной (её уже загрузил тот, кто ждал блокировку раньше) не перечитывается
+async def reload():
+    global revision
+    async with reload_lock:
+        new_revision = await redis_nikix.get_catalog_revision()
+        if revision is not None and new_revision <= revision:
+            return
+        version = await redis_nikix.get_catalog_version()
+        products = await redis_nikix.get_index_products(redis_nikix.catalog_index_key("all", version))
+        products.sort(key=lambda product: product.id, reverse=True)
+        build(products)
+        revision = new_revision
+        logger.info(f"Каталог загружен в память: {len(products)} товаров, ревизия {revision}")
+
+
+# Перечитать каталог, если он поменялся (после своих же изменений - не дожидаясь сообщения)
+async def refresh():
+    if revision is None or await redis_nikix.get_catalog_revision() != revision:
+        await reload()
+
+
+async def listen():
+    while True:
+        try:
+            async with redis_nikix.redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(redis_nikix.CATALOG_CHANNEL)
+                await refresh() # пока не были подписаны, могли пропустить сообщение
+                async for message in pubsub.listen():
+                    if message["type"] == "message" and int(message["data"]) != revision:
+                        await reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Подписка на обновления каталога прервалась: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+def start():
+    global listener_task
+    listener_task = asyncio.create_task(listen())
+
+
+def stop():
+    if listener_task is not None:
+        listener_task.cancel()
+
+
+def get_ordering(value, facet="brand"):
+    return orderings.get((facet, str(value)), [])
+
+
+# Товар по позиции в списке бренда (или другого признака): (товар, позиция, всего товаров).
+# Позиция -1 - последний товар, за концом списка - первый
+def get_page(value, position, facet="brand"):
+    ordering = get_ordering(value, facet)
+    total = len(ordering)
+    if total == 0:
+        return None, 0, 0
+    if position >= total or position < -total:
+        position = 0
+    if position < 0:
+        position += total
+    return records[ordering[position]], position, total
+
+
+# Товар по артикулу с его позицией в списке бренда: (товар, позиция, всего товаров)
+def get_position(value, art, facet="brand"):
+    number = positions.get(art)
+    if number is None:
+        return None, 0, 0
+    position = ordering_positions.get((facet, str(value)), {}).get(number)
+    if position is None:
+        return None, 0, 0
+    return records[number], position, len(get_ordering(value, facet))
+
+
+def get_product(art):
+    number = positions.get(art)
+    if number is None:
+        return None
+    return records[number]
+
+
+def get_products(value, facet="brand"):
+    return [records[number] for number in get_ordering(value, facet)]
+
+
+# Товары по списку артикулов в порядке каталога, неизвестные артикулы пропускаются
+def get_by_arts(arts):
+    numbers = sorted(positions[art] for art in arts if art in positions)
+    return [records[number] for number in numbers]
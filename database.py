@@ -4,12 +4,93 @@ from shutil import which
 import aiosqlite
 import csv
 import asyncio
-from main import send_admin_message
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+
+import product_model
+import main # send_admin_message берётся при вызове: main импортирует database, пока сам ещё не загружен
 
 DATABASE_PATH = "nikix_bot_database.db"
 
+# Постоянные соединения с базой: одно на запись (запись в sqlite всё равно идёт по одной) и несколько на чтение.
+# Открываются в on_startup через open_db(), закрываются в on_shutdown через close_db().
+# Если пул не открыт (отдельные скрипты вроде debug.py), каждый вызов открывает своё соединение как раньше
+READERS_COUNT = 4
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL", # читатели не блокируют запись и наоборот
+    "PRAGMA synchronous=NORMAL", # в режиме WAL этого достаточно, чтобы не потерять базу при сбое
+    "PRAGMA cache_size=-16000", # 16 мб кэша страниц на соединение
+    "PRAGMA mmap_size=134217728", # 128 мб файла читаются через mmap
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+writer = None
+writer_lock = None
+readers = None
+
+
+async def open_connection():
+    db = await aiosqlite.connect(DATABASE_PATH)
+    for pragma in PRAGMAS:
+        await db.execute(pragma)
+    return db
+
+
+async def open_db(readers_count=READERS_COUNT):
+    global writer, writer_lock, readers
+    if writer is not None:
+        return
+    writer = await open_connection()
+    writer_lock = asyncio.Lock()
+    readers = asyncio.Queue()
+    for _ in range(readers_count):
+        readers.put_nowait(await open_connection())
+
+
+async def close_db():
+    global writer, writer_lock, readers
+    if writer is None:
+        return
+    pool, readers = readers, None
+    while not pool.empty():
+        await pool.get_nowait().close()
+    await writer.close()
+    writer = None
+    writer_lock = None
+
+
+# Соединение для записи. Писатели идут по очереди, иначе commit одного зафиксировал бы чужие изменения
+@asynccontextmanager
+async def write_db():
+    if writer is None:
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            yield db
+        return
+    async with writer_lock:
+        try:
+            yield writer
+        finally:
+            # Незакоммиченное после ошибки откатываем, чтобы оно не уехало в базу со следующей записью
+            if writer.in_transaction:
+                await writer.rollback()
+
+
+# Соединение для чтения из пула
+@asynccontextmanager
+async def read_db():
+    if readers is None:
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            yield db
+        return
+    db = await readers.get()
+    try:
+        yield db
+    finally:
+        readers.put_nowait(db)
+
 async def init_db():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         # Таблица пользователи
         await db.execute('''
             CREATE TABLE IF NOT EXISTS users(
@@ -92,6 +173,16 @@ async def init_db():
                         );
                     ''')
 
+        # Таблица подписок "сообщить о поступлении": размер - ключ size_model, "*" - любой размер
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS size_alerts(
+                user_id INTEGER,
+                art VARCHAR(30),
+                size VARCHAR(10),
+                when_created DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+            ''')
+
         # индексы
         await db.execute('CREATE INDEX IF NOT EXISTS idx_basket_user_id ON basket(user_id);')
         await db.execute('CREATE INDEX IF NOT EXISTS idx_basket_art ON basket(art);')
@@ -109,69 +200,125 @@ async def init_db():
 
         await db.execute('CREATE INDEX IF NOT EXISTS idx_users_name ON users(user_name)')
 
+        # по артикулу сразу находятся все подписчики, без перебора пользователей
+        await db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_size_alerts_art ON size_alerts(art, size, user_id)')
+        await db.execute('CREATE INDEX IF NOT EXISTS idx_size_alerts_user_id ON size_alerts(user_id)')
+
         await db.commit() # конец init
 
 
+PRODUCT_COLUMNS = ("type", "name", "maker", "material", "season", "brand", "price", "art", "photo_url", "channel_url", "anki_url", "is_drop", "drop_price")
+UPSERT_PRODUCT_QUERY = (f"INSERT INTO products ({', '.join(PRODUCT_COLUMNS)}) VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))}) "
+                        f"ON CONFLICT(art) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in PRODUCT_COLUMNS if column != 'art')}")
+
+
+# Проверка и приведение строки csv к параметрам запроса. При ошибке ValueError с понятным текстом
+def parse_product_row(row):
+    cleaned_row = {key.strip(): (value.strip() if value else "") for key, value in row.items() if key}
+    missing = [column for column in PRODUCT_COLUMNS if column not in ("is_drop", "drop_price") and column not in cleaned_row]
+    if missing:
+        raise ValueError(f"нет столбцов: {', '.join(missing)}")
+    if not cleaned_row["art"]:
+        raise ValueError("пустой артикул")
+    if cleaned_row.get("is_drop") not in ["0", "1"]:
+        cleaned_row["is_drop"] = "0"
+    if not cleaned_row.get("drop_price"):
+        cleaned_row["drop_price"] = "0"
+    try:
+        price = int(cleaned_row["price"])
+        drop_price = int(cleaned_row["drop_price"])
+    except ValueError:
+        raise ValueError(f"цена должна быть целым числом: price={cleaned_row['price']!r}, drop_price={cleaned_row['drop_price']!r}")
+    return (cleaned_row['type'], cleaned_row['name'], cleaned_row['maker'], cleaned_row['material'].replace(":", ", ").lower(),
+            cleaned_row['season'].replace(":", ", "), cleaned_row['brand'], price, cleaned_row['art'], cleaned_row['photo_url'],
+            cleaned_row['channel_url'], cleaned_row['anki_url'], int(cleaned_row["is_drop"]), drop_price)
+
+
+# Загрузка товаров из csv. Сначала все строки проверяются, потом годные пишутся одним executemany.
+# Если база отвергла пачку (например, ограничение на строке, прошедшей проверку), пачка откатывается
+# и строки пишутся по одной: загружается всё, что можно, отвергнутые строки попадают в отчёт.
+# Товар с уже существующим артикулом обновляется (id и место в каталоге сохраняются).
+# Ошибочные строки собираются в один отчёт рядом с csv, возвращается (сколько загружено, путь к отчёту или None)
 async def upload_products(csv_file_path):
-    flag = 0
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        async with db.execute('BEGIN'):
-            with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
-                reader = csv.DictReader(csv_file)
-                reader.fieldnames = [field.strip() for field in reader.fieldnames]
-                for row in reader:
-                    try:
-                        cleaned_row = {key.strip(): (value.strip() if value else "") for key, value in row.items()}
-                        if cleaned_row["is_drop"] not in ["0", "1"]:
-                            cleaned_row["is_drop"] = "0"
-                        if not cleaned_row["drop_price"]:
-                            cleaned_row["drop_price"]= "0"
-                        await db.execute('''
-                        INSERT INTO products (type, name, maker, material, season, brand, price, art, photo_url, channel_url, anki_url, is_drop, drop_price)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-                        ''', (cleaned_row['type'], cleaned_row['name'], cleaned_row['maker'], cleaned_row['material'].replace(":", ", ").lower(), cleaned_row['season'].replace(":", ", "), cleaned_row['brand'], int(cleaned_row['price']), cleaned_row['art'], cleaned_row['photo_url'], cleaned_row['channel_url'], cleaned_row['anki_url'], int(cleaned_row["is_drop"]), int(cleaned_row["drop_price"])))
-                    except Exception as e:
-                        flag = 1
-                        await asyncio.sleep(0.2)
-                        await send_admin_message(message=f"Ошибка при загрузке строки {row}: {e}", is_log=True)
-
+    rows = []
+    lines = [] # номер строки csv и сама строка для каждого элемента rows - для отчёта
+    errors = []
+    with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
+        reader = csv.DictReader(csv_file)
+        reader.fieldnames = [field.strip() for field in reader.fieldnames or []]
+        for row in reader:
+            try:
+                rows.append(parse_product_row(row))
+                lines.append((reader.line_num, row))
+            except ValueError as e:
+                errors.append(f"Строка {reader.line_num}: {e}\n{row}\n")
+
+    loaded = len(rows)
+    async with write_db() as db:
+        try:
+            await db.executemany(UPSERT_PRODUCT_QUERY, rows)
+        except sqlite3.Error:
+            await db.rollback()
+            for params, (line_num, row) in zip(rows, lines):
+                try:
+                    await db.execute(UPSERT_PRODUCT_QUERY, params)
+                except sqlite3.Error as e:
+                    loaded -= 1
+                    errors.append(f"Строка {line_num}: база не приняла строку: {e}\n{row}\n")
         await db.commit()
-    if flag == 0:
-        await send_admin_message('Загрузка таблицы успешно завершена')
+
+    report_path = None
+    if errors:
+        report_path = f"{os.path.splitext(csv_file_path)[0]}_errors.txt"
+        with open(report_path, "w", encoding="utf-8") as file:
+            file.write(f"Не загружено строк: {len(errors)}\n\n" + "\n".join(errors))
+        await main.send_admin_message(f'Загрузка таблицы завершена с ошибками: загружено {loaded}, не загружено {len(errors)}. Отчёт: {report_path}', is_log=True)
     else:
-        await send_admin_message('Загрузка таблицы завершена с ошибками. Посмотри логи!')
+        await main.send_admin_message(f'Загрузка таблицы успешно завершена, загружено {loaded}', is_log=True)
+    return loaded, report_path
 
 async def delete_all_data():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute('DELETE FROM products;')
         await db.commit()
 
+# Товары отдаются как product_model.Product
+PRODUCT_SELECT_QUERY = f"SELECT {', '.join(product_model.FIELDS)} FROM products"
+
 async def fetch_products(brand: str):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         if brand == "all":
-            cursor = await db.execute('SELECT * FROM products')
+            cursor = await db.execute(PRODUCT_SELECT_QUERY)
         else:
-            cursor = await db.execute('SELECT * FROM products WHERE brand = ?', (brand,))
+            cursor = await db.execute(f'{PRODUCT_SELECT_QUERY} WHERE brand = ?', (brand,))
         rows = await cursor.fetchall()
-        products = [{"id": row[0], "type": row[1], "name": row[2], "maker": row[3], "material": row[4], "season": row[5], "brand": row[6], "price": row[7], "art": row[8], "photo_url": row[9], "channel_url": row[10], "anki_url": row[11], "is_drop": row[12], "drop_price": row[13]} for row in rows]
+        products = [product_model.from_row(row) for row in rows]
         return products
 
+async def fetch_product_by_art(art: str):
+    async with read_db() as db:
+        cursor = await db.execute(f'{PRODUCT_SELECT_QUERY} WHERE art = ?', (art,))
+        row = await cursor.fetchone()
+        if row is None:
+            return None
+        return product_model.from_row(row)
+
 #Взять названия брендов из базы
 async def fetch_brands():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         cursor = await db.execute("SELECT DISTINCT brand FROM products;") #Запрос вернёт список всех уникальных брендов таблицы products
         brands = await cursor.fetchall()
         return [row[0] for row in brands if row[0]] #Возвращение списка, исключая None или пустые значения
 
 #Добавить товар в корзину
 async def add_to_basket(user_id: int, art: int, size: str):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute('INSERT INTO basket (user_id, art, size) VALUES (?, ?, ?)', (user_id, art, size))
         await db.commit()
 
 #Получение товаров из корзины
 async def fetch_basket(user_id: int, count=False):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         query = """
         SELECT b.id AS basket_id, p.id AS product_id, p.name, p.price, photo_url, b.size, p.art, p.channel_url, p.is_drop, p.drop_price
         FROM basket b
@@ -205,24 +352,53 @@ async def fetch_basket(user_id: int, count=False):
             return i
 
 async def clear_basket(user_id: int, basket_id: int, is_all: int):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         if is_all == 0:
             await  db.execute("DELETE FROM basket WHERE id = ?", (basket_id,)) #Удаляем один товар из корзины
         else:
             await  db.execute("DELETE FROM basket WHERE user_id = ?", (user_id,)) #Удаляем все товары из корзины
         await db.commit()
 
+# Подписаться на поступление размера
+async def add_size_alert(user_id: int, art: str, size: str):
+    async with write_db() as db:
+        await db.execute('INSERT OR IGNORE INTO size_alerts (user_id, art, size) VALUES (?, ?, ?)', (user_id, art, size))
+        await db.commit()
+
+# Подписчики на поступление размеров товара: [(user_id, размер)]
+async def fetch_size_alerts(art: str):
+    async with read_db() as db:
+        cursor = await db.execute('SELECT user_id, size FROM size_alerts WHERE art = ?', (art,))
+        rows = await cursor.fetchall()
+        await cursor.close()
+        return [(row[0], row[1]) for row in rows]
+
+# Размеры товара, на которые подписан пользователь
+async def fetch_user_size_alerts(user_id: int, art: str):
+    async with read_db() as db:
+        cursor = await db.execute('SELECT size FROM size_alerts WHERE user_id = ? AND art = ?', (user_id, art))
+        rows = await cursor.fetchall()
+        await cursor.close()
+        return [row[0] for row in rows]
+
+# Снять подписки пользователя на размеры товара (после уведомления)
+async def delete_size_alerts(user_id: int, art: str, sizes):
+    async with write_db() as db:
+        await db.executemany('DELETE FROM size_alerts WHERE art = ? AND size = ? AND user_id = ?',
+                             [(art, size, user_id) for size in sizes])
+        await db.commit()
+
 # Вернуть все юрл для парсинга размеров
 async def fetch_url_sizes():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("SELECT art, anki_url FROM products")
+    async with read_db() as db:
+        cursor = await db.execute("SELECT art, anki_url, is_drop FROM products")
         rows = await cursor.fetchall()
-        urls = [{"art": row[0], "url": row[1]} for row in rows]
+        urls = [{"art": row[0], "url": row[1], "is_drop": row[2]} for row in rows]
         await cursor.close()
         return urls
 
 async def fetch_users(onlyID=0):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         if onlyID == 1:
             cursor = await db.execute("SELECT user_id FROM users")
             rows = await cursor.fetchall()
@@ -237,7 +413,7 @@ async def fetch_users(onlyID=0):
             return users
 
 async def fetch_username_from_id(user_id):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         cursor = await db.execute("SELECT user_name FROM users WHERE user_id = ?", (user_id,))
         rows = await cursor.fetchall()
         return rows[0]
@@ -245,18 +421,20 @@ async def fetch_username_from_id(user_id):
 
 # Добавить пользователя при старте
 async def add_user(user_id: int, user_name: str, first_name: str):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute("INSERT INTO users (user_id, user_name, first_name) VALUES (?, ?, ?)", (user_id, user_name, first_name))
         await db.commit()
 
 async def delete_all_users():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute("DELETE FROM users")
         await db.commit()
 
 
+# Сообщения админу об ошибках отправляются после выхода из write_db: пока идёт запрос в telegram,
+# остальные писатели не должны ждать блокировку
 async def add_order(user_id, basket, fio, phone_number, address, delivery_way, preview, pay_way, status, comment, delivery_price):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         try:
             cursor = await db.execute("INSERT INTO orders (user_id, fio, phone_number, address, delivery_way, preview, pay_way, status, comment, delivery_price, message_from_channel) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (user_id, fio, phone_number, address, delivery_way, preview, pay_way, status, comment, delivery_price, 0))
             await db.commit()
@@ -267,11 +445,12 @@ async def add_order(user_id, basket, fio, phone_number, address, delivery_way, p
             return 2000 + order_id # Вернуть номер последнего заказа, то есть который добавили только что
         except Exception as e:
             await db.rollback()
-            await send_admin_message(f"Ошибка при добавлении заказа: {e}")
-            raise
+            error = e
+    await main.send_admin_message(f"Ошибка при добавлении заказа: {error}")
+    raise error
 
 async def change_channel_id_for_order(order_id, message_id):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         try:
             await db.execute("UPDATE orders SET message_from_channel = ? WHERE id = ?", (message_id, order_id))
             await db.commit()
@@ -280,13 +459,13 @@ async def change_channel_id_for_order(order_id, message_id):
         return 1
 
 async def fetch_message_channel_id(order_id):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         cursor = await db.execute("SELECT message_from_channel FROM orders WHERE id = ?", (order_id,))
         rows = await cursor.fetchone()
         return rows[0]
 
 async def set_order_status(order_id, status):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         try:
             await db.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
             await db.commit()
@@ -294,30 +473,40 @@ async def set_order_status(order_id, status):
             return e
         return 1
 
-async def fetch_orders(user_id: int, id=0):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        query = "SELECT id, user_id, fio, phone_number, address, delivery_way, preview, pay_way, status, comment, delivery_price, when_buy FROM orders WHERE"
+# Заказы пользователя (или один заказ по id) вместе с товарами: два запроса на все заказы, товары раскладываются по заказам здесь.
+# headers_only=True - только номер и статус, для списка "Мои заказы" товары не нужны
+async def fetch_orders(user_id: int, id=0, headers_only=False):
+    async with read_db() as db:
         if id == 0:
-            query += " user_id = ?"
-            cursor = await db.execute(query, (user_id,))
+            where, params = "user_id = ?", (user_id,)
         else:
-            query += " id = ?"
-            cursor = await db.execute(query, (id,))
+            where, params = "id = ?", (id,)
+        if headers_only:
+            cursor = await db.execute(f"SELECT id, status FROM orders WHERE {where}", params)
+            rows = await cursor.fetchall()
+            return [{"id": (2000 + row[0]), "status": row[1]} for row in rows]
+
+        cursor = await db.execute(f"SELECT id, user_id, fio, phone_number, address, delivery_way, preview, pay_way, status, comment, delivery_price, when_buy FROM orders WHERE {where}", params)
         rows = await cursor.fetchall()
+        if not rows:
+            return []
+        cursor = await db.execute(f"SELECT o.order_id, p.name, o.art, o.size, p.channel_url, o.price, p.photo_url FROM order_items o INNER JOIN products p ON o.art = p.art "
+                                  f"WHERE o.order_id IN (SELECT id FROM orders WHERE {where}) ORDER BY o.rowid", params)
+        items = await cursor.fetchall()
+        products_by_order = {row[0]: [] for row in rows}
+        for item in items:
+            products_by_order[item[0]].append({"name": item[1], "art": item[2], "size": item[3], "channel_url": item[4], "price": item[5], "photo_url": item[6]})
         orders = []
         for row in rows:
-            cursor = await db.execute("SELECT p.name, o.art, o.size, p.channel_url, o.price, p.photo_url FROM order_items o INNER JOIN products p ON o.art = p.art WHERE o.order_id = ?", (row[0],))
-            items = await cursor.fetchall()
-            products = [{"name": item[0], "art": item[1], "size": item[2], "channel_url": item[3], "price": item[4], "photo_url": item[5]} for item in items]
             orders.append({"id": (2000 + row[0]), "user_id": row[1], "fio": row[2], "phone": row[3],
                            "address": row[4], "delivery_way": row[5], "preview": row[6], "pay_way": row[7],
                            "status": row[8], "comment": row[9],"delivery_price": row[10], "when_buy": row[11],
-                           "products": products})
+                           "products": products_by_order[row[0]]})
         return orders
 
 
 async def fetch_products_from_search(mode, data): # 0-season, 1-size, 2-art
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         if mode == 0:
             cursor = await db.execute('SELECT * FROM products WHERE season LIKE ?', (data,))
             rows = await cursor.fetchall()
@@ -332,7 +521,7 @@ async def fetch_products_from_search(mode, data): # 0-season, 1-size, 2-art
             cursor = await db.execute('SELECT * FROM products WHERE art LIKE ?', (data,))
             rows = await cursor.fetchall()
         else:
-            await send_admin_message("Ошибка поиска")
+            await main.send_admin_message("Ошибка поиска")
             return
         products = [{"id": row[0], "type": row[1], "name": row[2], "maker": row[3], "material": row[4], "season": row[5],
                      "brand": row[6], "price": row[7], "art": row[8], "photo_url": row[9], "channel_url": row[10],
@@ -342,26 +531,32 @@ async def fetch_products_from_search(mode, data): # 0-season, 1-size, 2-art
 
 
 async def change_price(new_price: int, art: str):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    error = None
+    async with write_db() as db:
         try:
             await db.execute("UPDATE products SET price = ? WHERE art = ?", (new_price, art))
             await db.commit()
         except Exception as e:
-            await send_admin_message(f"Не удалось обновить цену: {e}")
+            error = e
+    if error is not None:
+        await main.send_admin_message(f"Не удалось обновить цену: {error}")
 
 async def delete_product(art: str):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    error = None
+    async with write_db() as db:
         try:
             await db.execute("DELETE FROM products WHERE art = ?", (art,))
             await db.commit()
         except Exception as e:
-            await send_admin_message(f"Не удалось удалить товар: {e}")
+            error = e
+    if error is not None:
+        await main.send_admin_message(f"Не удалось удалить товар: {error}")
 
 
 # Загрузка ссылок на фото в базу, перед загрузкой происходит автоматическое удаление старых ссылок
 async def upload_photo_links(csv_file_path):
-    flag = 0
-    async with (aiosqlite.connect(DATABASE_PATH) as db):
+    failed_rows = []
+    async with write_db() as db:
         await db.execute("DELETE FROM photo_links")
         await db.commit()
         async with db.execute('BEGIN'):
@@ -373,22 +568,23 @@ async def upload_photo_links(csv_file_path):
                         cleaned_row = {key.strip(): (value.strip() if value else "") for key, value in row.items()}
                         await db.execute("INSERT INTO photo_links (art, photo2_url, photo3_url, photo4_url) VALUES (?, ?, ?, ?)", (cleaned_row["art"], cleaned_row["photo2_url"], cleaned_row["photo3_url"], cleaned_row["photo4_url"]))
                     except Exception as e:
-                        flag = 1
-                        await asyncio.sleep(0.2)
-                        await send_admin_message(message=f"Ошибка при загрузке строки {row}: {e}", is_log=True)
+                        failed_rows.append((row, e))
 
         await db.commit()
-    if flag == 0:
-        await send_admin_message('Загрузка таблицы успешно завершена')
+    for row, e in failed_rows:
+        await asyncio.sleep(0.2)
+        await main.send_admin_message(message=f"Ошибка при загрузке строки {row}: {e}", is_log=True)
+    if not failed_rows:
+        await main.send_admin_message('Загрузка таблицы успешно завершена')
     else:
-        await send_admin_message('Загрузка таблицы завершена с ошибками. Посмотри логи!')
+        await main.send_admin_message('Загрузка таблицы завершена с ошибками. Посмотри логи!')
 
 
 
 # Получить ссылки по артикулу
 async def fetch_photo_links_by_art(art):
     photo_links = []
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         cursor = await db.execute('SELECT photo_url FROM products WHERE art = ?', (art,))
         row = await cursor.fetchone()
         photo_links.append(row[0])
@@ -398,7 +594,7 @@ async def fetch_photo_links_by_art(art):
 
 
 async def fetchall_dop_photos():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         cursor = await db.execute("SELECT p.art, p.photo_url, u.photo2_url, u.photo3_url, u.photo4_url FROM products p INNER JOIN photo_links u ON p.art = u.art")
         rows = await cursor.fetchall()
         print(rows)
@@ -406,20 +602,23 @@ async def fetchall_dop_photos():
 
 #
 async def edit_post_link(art, new_link):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    error = None
+    async with write_db() as db:
         try:
             await db.execute("UPDATE products SET channel_url = ? WHERE art = ?", (new_link, art))
             await db.commit()
         except Exception as e:
-            await send_admin_message(f"Не удалось изменить ссылку: {e}")
+            error = e
+    if error is not None:
+        await main.send_admin_message(f"Не удалось изменить ссылку: {error}")
 
 async def give_drop_access_to_user(user_id):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute("UPDATE users SET drop_access = ? WHERE user_id = ?", (1, user_id))
         await db.commit()
 
 async def fetch_drop_access():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with read_db() as db:
         cursor = await db.execute("SELECT user_id, drop_access FROM users")
         rows = await cursor.fetchall()
         access = {}
@@ -428,12 +627,12 @@ async def fetch_drop_access():
         return access
 
 async def delete_drop_access():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute("UPDATE users SET drop_access = ?", (0,))
         await db.commit()
 
 
 async def stop_drop():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with write_db() as db:
         await db.execute("UPDATE products SET is_drop = ?", (0,))
         await db.commit()
\ No newline at end of file
@@ -1,8 +1,17 @@
 import aiohttp
 from bs4 import BeautifulSoup
 import asyncio
+import hashlib
 import json
+import multiprocessing
+import random
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
 
 # URL страницы товара
 url = "https://anki.team/product/hoka-one-one-x-nicole-mclaughlin-mafate-three2-white-neon-yellow/3628"
@@ -13,48 +22,450 @@ headers = {
 }
 
 
-async def get_sizes(session, url, proxy):
+WHITESPACE_RE = re.compile(r'\s+')
+DIGIT_RE = re.compile(r'\d')
+
+
+# Текст размера из текстов span внутри label, None если в нём нет цифр
+def clean_size(size_parts):
+    # Собираем текст из всех span и объединяем, очищаем от лишних пробелов и символов
+    full_size = WHITESPACE_RE.sub(' ', ' '.join(part.strip() for part in size_parts)).strip()
+    # Берём только если есть цифры в размере
+    if DIGIT_RE.search(full_size):
+        return full_size
+    return None
+
+
+# Доступные размеры со страницы товара. Разбор страницы сделан в нескольких вариантах:
+# bs4 - исходный, через BeautifulSoup, scan - один проход стандартным HTMLParser без построения дерева
+# (тот же разборщик, что у bs4, поэтому результат совпадает всегда), lxml - через lxml, если он установлен.
+# lxml расходится с исходным на редких, но допустимых страницах (разметка внутри textarea и title, повтор атрибута,
+# одиночные суррогаты в тексте), поэтому по умолчанию scan, а lxml - только если передан явно.
+# Совпадение проверяет test_extract_parity.py
+def extract_sizes_bs4(html):
+    soup = BeautifulSoup(html, "html.parser")
+    labels = {}
+    for label in soup.find_all('label'):
+        if label.has_attr('for'):
+            labels.setdefault(label['for'], label) # как soup.find: первый label с таким for
+
+    # Находим все input-элементы с типом radio
+    available_sizes = []
+    for input_tag in soup.find_all('input', {'type': 'radio'}):
+        if not input_tag.has_attr('disabled'):
+            label = labels.get(input_tag['id'])
+            if label:
+                # Ищем все span внутри label
+                spans = label.find_all('span')
+                if spans:
+                    full_size = clean_size(span.text for span in spans)
+                    if full_size:
+                        available_sizes.append(full_size)
+    return available_sizes
+
+
+class SizesScanner(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.inputs = [] # (id, есть ли disabled) для всех radio по порядку
+        self.labels = {} # for -> тексты span, первый label с таким for
+        self.open_labels = [] # открытые label: тексты их span
+        self.open_spans = [] # открытые span: [(тексты span label, номер span)]
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'input':
+            attrs = dict(attrs)
+            if attrs.get('type') == 'radio':
+                self.inputs.append((attrs['id'] if 'disabled' not in attrs else None, 'disabled' in attrs))
+        elif tag == 'label':
+            spans = []
+            self.open_labels.append(spans)
+            for key, value in attrs[::-1]: # при повторе атрибута действует последний
+                if key == 'for':
+                    self.labels.setdefault(value, spans)
+                    break
+        elif tag == 'span' and self.open_labels:
+            entry = []
+            for spans in self.open_labels:
+                entry.append((spans, len(spans)))
+                spans.append("")
+            self.open_spans.append(entry)
+
+    def handle_endtag(self, tag):
+        if tag == 'span' and self.open_spans:
+            self.open_spans.pop()
+        elif tag == 'label' and self.open_labels:
+            spans = self.open_labels.pop()
+            # span, не закрытые внутри label, заканчиваются вместе с ним
+            while self.open_spans and self.open_spans[-1][-1][0] is spans:
+                self.open_spans.pop()
+
+    def handle_data(self, data):
+        for entry in self.open_spans:
+            for spans, index in entry:
+                spans[index] += data
+
+
+def extract_sizes_scan(html):
+    scanner = SizesScanner()
+    scanner.feed(html)
+    scanner.close()
+    available_sizes = []
+    for input_id, disabled in scanner.inputs:
+        if not disabled:
+            spans = scanner.labels.get(input_id)
+            if spans:
+                full_size = clean_size(spans)
+                if full_size:
+                    available_sizes.append(full_size)
+    return available_sizes
+
+
+EXTRACTORS = {"bs4": extract_sizes_bs4, "scan": extract_sizes_scan}
+
+try:
+    import lxml.html
+
+    LXML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+    def extract_sizes_lxml(html):
+        if not html.strip():
+            return []
+        root = lxml.html.fromstring(html.encode("utf-8"), parser=LXML_PARSER)
+        labels = {}
+        for label in root.iter('label'):
+            if label.get('for') is not None:
+                labels.setdefault(label.get('for'), label)
+        available_sizes = []
+        for input_tag in root.iter('input'):
+            if input_tag.get('type') == 'radio' and input_tag.get('disabled') is None:
+                label = labels.get(input_tag.attrib['id'])
+                if label is not None:
+                    spans = list(label.iter('span'))
+                    if spans:
+                        full_size = clean_size(span.text_content() for span in spans)
+                        if full_size:
+                            available_sizes.append(full_size)
+        return available_sizes
+
+    EXTRACTORS["lxml"] = extract_sizes_lxml
+except ImportError:
+    pass
+
+DEFAULT_EXTRACTOR = "scan"
+
+
+def extract_sizes(html, extractor=None):
+    return EXTRACTORS[extractor or DEFAULT_EXTRACTOR](html)
+
+
+# Пул прокси. В bot_settings.json список "proxies" (старый одиночный "proxy" тоже понимается), None - без прокси.
+# Для каждого прокси считаются запросы, ошибки и задержка. Запросы распределяются между здоровыми случайно,
+# с весом по здоровью: быстрые и без ошибок получают больше. После PROXY_MAX_ERRORS ошибок подряд прокси уходит
+# в карантин, каждый следующий раз вдвое дольше, до PROXY_MAX_QUARANTINE
+PROXY_MAX_ERRORS = 3
+PROXY_QUARANTINE = 5 * 60
+PROXY_MAX_QUARANTINE = 60 * 60
+PROXY_LATENCY_ALPHA = 0.2
+PROXY_FAIL_STATUSES = (403, 407, 429) # ответы, в которых виноват прокси (бан, авторизация), а не страница
+
+proxies = {} # прокси -> статистика
+
+
+def read_proxies(data):
+    return data.get("proxies") or [data.get("proxy")]
+
+
+def sync_proxies(proxy_list):
+    for proxy in proxy_list:
+        if proxy not in proxies:
+            proxies[proxy] = {"requests": 0, "errors": 0, "latency": None, "errors_in_row": 0,
+                              "quarantines": 0, "quarantined_until": 0}
+    for proxy in list(proxies):
+        if proxy not in proxy_list:
+            del proxies[proxy]
+
+
+def proxy_weight(stats):
+    error_rate = (stats["errors"] + 1) / (stats["requests"] + 2)
+    latency = stats["latency"] or 1
+    return (1 - error_rate) / latency
+
+
+def pick_proxy():
+    now = time.time()
+    healthy = [proxy for proxy, stats in proxies.items() if stats["quarantined_until"] <= now]
+    if not healthy:
+        # Все в карантине - берём тот, который выйдет раньше всех, лучше так, чем совсем без запросов
+        return min(proxies, key=lambda proxy: proxies[proxy]["quarantined_until"]) if proxies else None
+    return random.choices(healthy, weights=[proxy_weight(proxies[proxy]) for proxy in healthy])[0]
+
+
+def report_proxy(proxy, ok, latency):
+    stats = proxies.get(proxy)
+    if stats is None:
+        return
+    stats["requests"] += 1
+    if ok:
+        stats["errors_in_row"] = 0
+        stats["quarantines"] = 0
+        stats["latency"] = latency if stats["latency"] is None else (1 - PROXY_LATENCY_ALPHA) * stats["latency"] + PROXY_LATENCY_ALPHA * latency
+        return
+    stats["errors"] += 1
+    stats["errors_in_row"] += 1
+    if stats["quarantined_until"] > time.time():
+        return # уже в карантине, это ответы на запросы, отправленные раньше
+    if stats["errors_in_row"] >= PROXY_MAX_ERRORS:
+        stats["quarantined_until"] = time.time() + min(PROXY_QUARANTINE * 2 ** stats["quarantines"], PROXY_MAX_QUARANTINE)
+        stats["quarantines"] += 1
+        stats["errors_in_row"] = 0
+        print(f"Прокси {proxy_name(proxy)} в карантине до {time.strftime('%H:%M', time.localtime(stats['quarantined_until']))}")
+
+
+# Прокси без логина и пароля, для показа админу
+def proxy_name(proxy):
+    if proxy is None:
+        return "без прокси"
+    return proxy.rsplit("@", 1)[-1]
+
+
+def proxy_stats():
+    now = time.time()
+    result = []
+    for proxy, stats in proxies.items():
+        result.append({"name": proxy_name(proxy), "requests": stats["requests"], "errors": stats["errors"],
+                       "latency": stats["latency"],
+                       "quarantined_until": stats["quarantined_until"] if stats["quarantined_until"] > now else None})
+    return result
+
+
+NOT_MODIFIED = 304
+RETRYABLE = -2 # временная ошибка сайта (таймаут, обрыв, 5xx, 429), есть смысл повторить
+CIRCUIT_OPEN = -3 # сайт сейчас лежит, запрос даже не отправлялся
+PROXY_ERROR = -4 # не пустил прокси (403/407 через прокси, не удалось подключиться к прокси): повторить через другой,
+                 # сайт при этом не считается лежащим
+RETRY_STATUSES = (429, 403, 407) # плюс все 5xx
+PROXY_STATUSES = (403, 407)
+
+
+# Запрос страницы товара: (html, {"etag", "last_modified"}), (-1, None) при ошибке, (RETRYABLE, None) при временной ошибке,
+# (PROXY_ERROR, None), если виноват прокси,
+# или (NOT_MODIFIED, None), если передано прошлое состояние страницы и сервер ответил, что она не менялась
+async def request_page(session, url, proxy, page=None):
+    request_headers = headers
+    if page:
+        request_headers = dict(headers)
+        if page.get("etag"):
+            request_headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            request_headers["If-Modified-Since"] = page["last_modified"]
+    start = time.monotonic()
     try:
-        async with session.get(url, headers=headers, proxy=proxy, timeout=10) as response:
+        async with session.get(url, headers=request_headers, proxy=proxy, timeout=10) as response:
+            if response.status == 304 and page:
+                report_proxy(proxy, True, time.monotonic() - start)
+                return NOT_MODIFIED, None
             if response.status == 200:
+                validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
                 html = await response.text()
-                soup = BeautifulSoup(html, "html.parser")
-
-                # Находим все input-элементы с типом radio
-                inputs = soup.find_all('input', {'type': 'radio'})
-
-                available_sizes = []
-                for input_tag in inputs:
-                    if not input_tag.has_attr('disabled'):
-                        label = soup.find('label', {'for': input_tag['id']})
-                        if label:
-                            # Ищем все span внутри label
-                            spans = label.find_all('span')
-                            if spans:
-                                # Собираем текст из всех span и объединяем
-                                size_parts = [span.text.strip() for span in spans]
-                                full_size = ' '.join(size_parts)
-
-                                # Очищаем от лишних пробелов и символов
-                                full_size = re.sub(r'\s+', ' ', full_size).strip()
-
-                                # Добавляем только если есть цифры в размере
-                                if re.search(r'\d', full_size):
-                                    available_sizes.append(full_size)
-                return available_sizes
+                report_proxy(proxy, True, time.monotonic() - start)
+                return html, validators
             else:
+                # Прокси ответил - значит, работает. 5xx - ошибка самого сайта, она идёт в предохранитель сайта
+                report_proxy(proxy, response.status not in PROXY_FAIL_STATUSES, time.monotonic() - start)
                 print(f"Ошибка при запросе {url}. Код статуса: {response.status}")
-                return -1
+                if proxy is not None and response.status in PROXY_STATUSES:
+                    return PROXY_ERROR, None
+                if response.status in RETRY_STATUSES or response.status >= 500:
+                    return RETRYABLE, None
+                return -1, None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        report_proxy(proxy, False, time.monotonic() - start)
+        print(f"Ошибка при запросе {url}: {e!r}")
+        if isinstance(e, (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError)):
+            return PROXY_ERROR, None
+        if isinstance(e, aiohttp.InvalidURL):
+            return -1, None
+        return RETRYABLE, None
+    except Exception as e:
+        report_proxy(proxy, False, time.monotonic() - start)
+        print(f"Ошибка при запросе {url}: {e!r}")
+        return -1, None
+
+
+# Предохранитель на каждый сайт: после BREAKER_FAILURES временных ошибок подряд запросы к сайту не отправляются
+# BREAKER_COOLDOWN секунд. Потом пропускается один пробный запрос: удачный - всё как обычно, неудачный -
+# снова пауза, каждый раз вдвое дольше, до BREAKER_MAX_COOLDOWN. Ошибки прокси сюда не считаются (report_proxy)
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 60
+BREAKER_MAX_COOLDOWN = 10 * 60
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 10
+
+breakers = {} # сайт -> {"failures", "open_until", "opened", "probe"}
+
+
+def get_breaker(host):
+    if host not in breakers:
+        breakers[host] = {"failures": 0, "open_until": 0, "opened": 0, "probe": False}
+    return breakers[host]
+
+
+def breaker_allows(host):
+    breaker = get_breaker(host)
+    if breaker["failures"] < BREAKER_FAILURES:
+        return True
+    if time.time() < breaker["open_until"] or breaker["probe"]:
+        return False
+    breaker["probe"] = True # пауза прошла, пропускаем один пробный запрос
+    return True
+
+
+def breaker_success(host):
+    breaker = get_breaker(host)
+    breaker.update(failures=0, opened=0, probe=False)
+
+
+def breaker_failure(host):
+    breaker = get_breaker(host)
+    breaker["failures"] += 1
+    breaker["probe"] = False
+    if time.time() < breaker["open_until"]:
+        return # уже на паузе, это ответы на запросы, отправленные раньше
+    if breaker["failures"] >= BREAKER_FAILURES:
+        breaker["open_until"] = time.time() + min(BREAKER_COOLDOWN * 2 ** breaker["opened"], BREAKER_MAX_COOLDOWN)
+        breaker["opened"] += 1
+        print(f"Сайт {host} не отвечает, запросы остановлены до {time.strftime('%H:%M:%S', time.localtime(breaker['open_until']))}")
+
+
+# Запрос с повторами: временные ошибки повторяются до RETRY_ATTEMPTS раз через случайную паузу
+# (от 0 до RETRY_BASE_DELAY * 2^попытка, не больше RETRY_MAX_DELAY), каждый раз через другой прокси из пула.
+# Пока ждём паузу, место в semaphore свободно для других страниц. Если сайт лежит - (CIRCUIT_OPEN, None) без запроса
+async def fetch_with_retry(session, url, page=None, proxy=None, semaphore=None, limiter=None):
+    host = urlsplit(url).hostname
+    for attempt in range(RETRY_ATTEMPTS):
+        if not breaker_allows(host):
+            return CIRCUIT_OPEN, None
+        probe = get_breaker(host)["probe"] # этот запрос - пробный после паузы
+        try:
+            async with semaphore or nullcontext():
+                if limiter:
+                    await limiter.wait()
+                html, validators = await request_page(session, url, proxy or pick_proxy(), page)
+            if html not in (RETRYABLE, PROXY_ERROR):
+                breaker_success(host) # сайт ответил, пусть и ошибкой вроде 404
+                return html, validators
+            if html == RETRYABLE:
+                breaker_failure(host)
+        finally:
+            # Пробный запрос отменён, упал с исключением или до сайта не дошёл (ошибка прокси):
+            # сайт не признан ни живым, ни лежащим, следующий запрос снова будет пробным
+            if probe:
+                get_breaker(host)["probe"] = False
+        if attempt + 1 < RETRY_ATTEMPTS:
+            await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+    return -1, None
+
+
+# Скачать страницу товара: html или -1 при ошибке
+async def fetch_page(session, url, proxy=None):
+    html, _ = await fetch_with_retry(session, url, proxy=proxy)
+    return html if isinstance(html, str) else -1
+
+
+async def get_sizes(session, url, proxy, extractor=None):
+    html = await fetch_page(session, url, proxy)
+    if html == -1:
+        return -1
+    try:
+        return extract_sizes(html, extractor)
     except Exception as e:
-        print(f"Ошибка при запросе {url}: {e}")
+        print(f"Ошибка разбора {url}: {e}")
         return -1
 
 
-async def test_size(url, proxy):
+# Разбор пачки страниц [(art, html)] -> {art: размеры или -1}. Выполняется в процессе из parse_pool
+def parse_batch(pages, extractor=None):
+    result = {}
+    for art, html in pages:
+        try:
+            result[art] = extract_sizes(html, extractor)
+        except Exception as e:
+            print(f"Ошибка разбора {art}: {e}")
+            result[art] = -1
+    return result
+
+
+# Кусок страницы, от которого зависят размеры: radio input и label целиком. Если его хэш не поменялся с прошлого раза,
+# страницу можно не разбирать. Незакрытый label захватывает всё до конца страницы, чтобы ничего не потерять
+SIZES_FRAGMENT_RE = re.compile(r'<input\b[^>]*\btype\s*=\s*["\']?radio\b[^>]*>|<label\b.*?(?:</label>|$)', re.S | re.I)
+
+
+def fragment_hash(html):
+    hasher = hashlib.blake2b(digest_size=16)
+    for match in SIZES_FRAGMENT_RE.finditer(html):
+        hasher.update(match.group().encode("utf-8", "surrogatepass"))
+    return hasher.hexdigest()
+
+
+# Что известно о каждой странице после последнего удачного разбора: url -> {"etag", "last_modified", "hash", "sizes"}.
+# Живёт в памяти, после перезапуска бота первый проход снова полный
+pages_state = {}
+# Итоги последнего get_all_sizes: сколько страниц не скачивали (304), скачали, но кусок с размерами тот же,
+# разобрали заново, сколько ошибок и сколько пропущено, пока сайт лежал
+last_run_stats = {}
+
+
+# Разбор страниц - работа для процессора, в цикле событий бота он задерживает ответы покупателям.
+# Поэтому при работе бота страницы разбираются в отдельных процессах (start_parse_pool в on_startup), пачками,
+# чтобы не гонять каждую страницу между процессами по отдельности. Без пула разбор идёт прямо в цикле, как раньше
+PARSE_WORKERS = 2
+PARSE_BATCH_SIZE = 10
+parse_pool = None
+
+
+def start_parse_pool(workers=PARSE_WORKERS):
+    global parse_pool
+    if parse_pool is None:
+        # spawn, а не fork: у бота к этому времени уже есть потоки (aiosqlite), fork с ними небезопасен
+        parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def stop_parse_pool():
+    global parse_pool
+    if parse_pool is not None:
+        parse_pool.shutdown(cancel_futures=True)
+        parse_pool = None
+
+
+async def parse_pages(pages, extractor=None):
+    global parse_pool
+    pool = parse_pool
+    if pool is None:
+        return parse_batch(pages, extractor)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, parse_batch, pages, extractor)
+    except BrokenProcessPool as e:
+        # Процесс разбора упал: пересоздаём пул, а эту пачку разбираем здесь.
+        # Пул пересоздаёт только первая пачка, заметившая поломку: остальные уже получат новый пул.
+        # Сломанный пул закрывается без ожидания, чтобы не останавливать цикл событий
+        if parse_pool is pool:
+            print(f"Пул разбора страниц сломан, перезапуск: {e}")
+            parse_pool = None
+            pool.shutdown(wait=False)
+            start_parse_pool()
+        return parse_batch(pages, extractor)
+
+
+async def test_size(url, proxy=None):
     async with aiohttp.ClientSession() as session:
-        with open("bot_settings.json", "r") as f:
-            data = json.load(f)
-            proxy = data["proxy"]
+        if proxy is None:
+            with open("bot_settings.json", "r") as f:
+                data = json.load(f)
+            sync_proxies(read_proxies(data))
+            proxy = pick_proxy()
         sizes = await get_sizes(session=session, url=url, proxy=proxy)
         if sizes == -1:
             print("Ошибка")
@@ -65,15 +476,151 @@ async def test_size(url, proxy):
             print("Доступные размеры:", sizes)
 
 
-async def get_all_sizes(urls):
+# Ограничение общего числа запросов в секунду: каждый следующий запрос ждёт своего слота
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = self.next_time - now
+        self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Настройки параллельного парсинга, можно переопределить в bot_settings.json
+MAX_CONCURRENCY = 10 # сколько страниц качается одновременно
+PER_HOST_LIMIT = 5 # соединений на один сайт
+MAX_REQUESTS_PER_SECOND = 5 # общий предел запросов в секунду, 0 - без ограничения
+
+
+PARSE_BATCH_WAIT = 0.2 # неполная пачка страниц уходит на разбор, если за это время не набралась
+PARSING = object() # страница отдана на разбор, результат придёт из него
+
+
+# Размеры для списка товаров [{"art", "url"}] по мере готовности: асинхронный генератор пар (art, размеры или -1).
+# Каждая страница отдаётся сразу, как только скачана и разобрана, не дожидаясь остальных.
+# partial=True: товары, до которых не дошли из-за лежащего сайта, не отдаются, чтобы их проверили
+# в следующий раз, а не считали ошибкой. partial=False: для них -1, как для ошибки
+async def stream_sizes(urls, concurrency=None, per_host=None, rate=None, extractor=None, partial=True):
+    global last_run_stats
+    with open("bot_settings.json", "r") as f:
+        data = json.load(f)
+    sync_proxies(read_proxies(data))
+    concurrency = concurrency or data.get("parser_concurrency", MAX_CONCURRENCY)
+    per_host = per_host or data.get("parser_per_host", PER_HOST_LIMIT)
+    rate = data.get("parser_rate", MAX_REQUESTS_PER_SECOND) if rate is None else rate
+    batch_size = PARSE_BATCH_SIZE if parse_pool is not None else 1
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    loop = asyncio.get_running_loop()
+    stats = {"pages": len(urls), "not_modified": 0, "unchanged": 0, "parsed": 0, "errors": 0, "skipped": 0}
+    output = asyncio.Queue() # (art, размеры, -1 или None, если товар пропущен)
+    tasks = set()
+    pages = [] # скачанные страницы, ждущие разбора: [(art, html)]
+    fetched = {} # art -> (url, состояние страницы после разбора)
+    flush_handle = None
+
+    # Каждая страница отдаётся в output ровно один раз, в том числе при любой ошибке (-1):
+    # потребитель ждёт ровно len(urls) результатов
+    # Отдача идёт в finally, чтобы страницы пачки дошли до output и при отмене разбора
+    async def parse(batch):
+        sizes = {}
+        try:
+            sizes = await parse_pages(batch, extractor)
+        except Exception as e:
+            print(f"Ошибка разбора пачки страниц: {e}")
+        finally:
+            for art, _ in batch:
+                value = sizes.get(art, -1)
+                try:
+                    url, page = fetched.pop(art)
+                    if value != -1:
+                        pages_state[url] = dict(page, sizes=value)
+                except Exception as e:
+                    print(f"Ошибка разбора страницы {art}: {e!r}")
+                    value = -1
+                finally:
+                    stats["errors" if value == -1 else "parsed"] += 1
+                    output.put_nowait((art, value))
+
+    def flush():
+        nonlocal pages, flush_handle
+        if flush_handle is not None:
+            flush_handle.cancel()
+            flush_handle = None
+        if pages:
+            task = asyncio.create_task(parse(pages))
+            tasks.add(task)
+            pages = []
+
+    # Размеры одной страницы для output или PARSING, если страница ушла на разбор (тогда её отдаст parse)
+    async def load(session, art, url):
+        nonlocal flush_handle
+        try:
+            html, validators = await fetch_with_retry(session, url, page=pages_state.get(url), semaphore=semaphore, limiter=limiter)
+        except Exception as e:
+            print(f"Ошибка при запросе {url}: {e!r}")
+            html, validators = -1, None
+        page = pages_state.get(url)
+        if html == CIRCUIT_OPEN:
+            stats["skipped"] += 1
+            return None if partial else -1
+        if html == -1:
+            stats["errors"] += 1
+            return -1
+        if html == NOT_MODIFIED:
+            stats["not_modified"] += 1
+            return page["sizes"]
+        page_hash = fragment_hash(html)
+        if page and page["hash"] == page_hash:
+            stats["unchanged"] += 1
+            page.update(validators)
+            return page["sizes"]
+        fetched[art] = (url, dict(validators, hash=page_hash))
+        pages.append((art, html))
+        if len(pages) >= batch_size:
+            flush()
+        elif flush_handle is None:
+            flush_handle = loop.call_later(PARSE_BATCH_WAIT, flush)
+        return PARSING
+
+    async def fetch(session, sneaker):
+        art, url = sneaker["art"], sneaker["url"]
+        try:
+            value = await load(session, art, url)
+        except Exception as e:
+            print(f"Ошибка обработки {url}: {e!r}")
+            stats["errors"] += 1
+            value = -1
+        if value is not PARSING:
+            output.put_nowait((art, value))
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks.update(asyncio.create_task(fetch(session, sneaker)) for sneaker in urls)
+            for _ in range(len(urls)):
+                art, value = await output.get()
+                if value is not None:
+                    yield art, value
+    finally:
+        if flush_handle is not None:
+            flush_handle.cancel()
+        for task in tasks:
+            task.cancel()
+        last_run_stats = stats
+
+
+# То же, что stream_sizes, но одним словарем {art: размеры или -1} в конце
+async def get_all_sizes(urls, concurrency=None, per_host=None, rate=None, extractor=None, partial=True):
     all_sizes = {}
-    async with aiohttp.ClientSession() as session:
-        with open("bot_settings.json", "r") as f:
-            data = json.load(f)
-            proxy = data["proxy"]
-        for sneaker in urls:
-            sizes = await get_sizes(session=session, url=sneaker["url"], proxy=proxy)
-            all_sizes[sneaker["art"]] = sizes
+    async for art, sizes in stream_sizes(urls, concurrency, per_host, rate, extractor, partial):
+        all_sizes[art] = sizes
     return all_sizes
 
 
@@ -0,0 +1,42 @@
+# Товар каталога. Один тип для товаров из sqlite, из redis и из каталога в памяти, чтобы поля везде были
+# одного типа: id, price, is_drop, drop_price - int, остальное - строки (раньше из redis is_drop приходил "0",
+# а из базы 0). Неизменяемый namedtuple без __dict__: собирается один раз при загрузке.
+# Поля читаются как атрибуты (product.name), изменённая копия - product._replace(price=...)
+import struct
+from collections import namedtuple
+
+# Порядок - как у колонок таблицы products, поэтому строка SELECT * превращается в товар без перекладывания
+FIELDS = ("id", "type", "name", "maker", "material", "season", "brand", "price", "art", "photo_url", "channel_url",
+          "anki_url", "is_drop", "drop_price")
+
+# Товар в redis одной строкой: версия схемы и числовые поля в struct, за ними строковые поля через \0.
+# Читается одним GET/MGET и разбирается одним unpack + одним decode, без словаря полей.
+# При изменении полей поднимается BLOB_VERSION: строки старой схемы читаются как отсутствующий товар
+BLOB_VERSION = 1
+BLOB_HEADER = struct.Struct("<Bqqbq") # версия, id, price, is_drop, drop_price
+SEPARATOR = "\0"
+
+
+class Product(namedtuple("Product", FIELDS)):
+    __slots__ = ()
+
+    # Строка для redis (см. BLOB_HEADER)
+    def to_blob(self):
+        strings = (self.type, self.name, self.maker, self.material, self.season, self.brand,
+                   self.art, self.photo_url, self.channel_url, self.anki_url)
+        return BLOB_HEADER.pack(BLOB_VERSION, self.id, self.price, self.is_drop, self.drop_price) + \
+            SEPARATOR.join(strings).encode("utf-8")
+
+
+# Товар из строки SELECT * FROM products
+def from_row(row):
+    return Product._make(row)
+
+
+# Товар из строки to_blob, None - другая версия схемы
+def from_blob(blob):
+    version, id, price, is_drop, drop_price = BLOB_HEADER.unpack_from(blob)
+    if version != BLOB_VERSION:
+        return None
+    strings = blob[BLOB_HEADER.size:].decode("utf-8").split(SEPARATOR)
+    return Product(id, *strings[:6], price, *strings[6:], is_drop, drop_price)
@@ -1,17 +1,20 @@
 import asyncio
 import redis.asyncio as redis
 import json
-redis_client = None
+import time
 
-# Подключение к redis
+import product_model
+import size_model
+# Клиент создаётся сразу (соединение открывается при первой команде), чтобы хранилище состояний aiogram
+# в main.py могло взять его ещё до старта бота
+redis_client = redis.Redis(host='localhost', port=6379, db=0)
+
+# Проверка подключения к redis
 async def redis_connect():
-    global redis_client
     try:
-        redis_client = redis.Redis(host='localhost', port=6379, db=0)
         await redis_client.set("test_connection", "ok")
         return "Успешное подключение к redis"
     except Exception as e:
-        redis_client = None
         return f"Не удалось подключится к redis: {e}"
 
 
@@ -43,175 +46,372 @@ async def check_and_add_user(user_id):
         return None
 
 
+# Каталог хранится в версиях: все ключи одной сборки лежат под префиксом catalog:{version}:,
+# а catalog:version указывает на текущую. Новая сборка пишется рядом со старой и включается одной командой SET
+CATALOG_VERSION_KEY = "catalog:version"
+# Счётчик номеров версий: номера не повторяются, поэтому отложенное удаление старой версии не заденет новую
+CATALOG_NEXT_VERSION_KEY = "catalog:next_version"
+# Отслуженные версии: sorted set номер -> время, после которого версию можно удалять. Лежит в redis,
+# чтобы версии, снятые перед перезапуском бота, удалились после него (resume_catalog_gc)
+CATALOG_RETIRED_KEY = "catalog:retired"
+# Служебные ключи каталога, которые не относятся ни к одной версии и не удаляются вместе с товарами
+CATALOG_CONTROL_KEYS = {CATALOG_VERSION_KEY, CATALOG_NEXT_VERSION_KEY, CATALOG_RETIRED_KEY}
+# Через сколько секунд после переключения удалять старую версию (чтобы дочитали запросы, начатые на ней)
+CATALOG_GC_DELAY = 60
+background_tasks = set()
+
+
+def catalog_key(version, key):
+    return f"catalog:{version}:{key}"
+
+
+async def get_catalog_version():
+    version = await redis_client.get(CATALOG_VERSION_KEY)
+    if version is None:
+        return 0
+    return int(version)
+
+
+# Ревизия каталога растёт при любом его изменении (пересборка, правка или удаление товара) и рассылается
+# в CATALOG_CHANNEL - по ней процессы бота перечитывают каталог в память (catalog_engine).
+# Лежит вне catalog:*, чтобы её не удалил redis_delete_all_products
+CATALOG_REVISION_KEY = "catalog_revision"
+CATALOG_CHANNEL = "catalog_updates"
+
+
+async def get_catalog_revision():
+    revision = await redis_client.get(CATALOG_REVISION_KEY)
+    if revision is None:
+        return 0
+    return int(revision)
+
+
+async def announce_catalog_change():
+    revision = await redis_client.incr(CATALOG_REVISION_KEY)
+    await redis_client.publish(CATALOG_CHANNEL, revision)
+
+
+def product_key_for(product, version):
+    return catalog_key(version, f"product:{product.brand}:{product.art}")
+
+
+# Ключ индекса каталога: sorted set ключей товаров (score = id) по значению одного признака.
+# Признаки: brand (для brand == "all" - весь каталог), season, type, drop. Сам товар хранится один раз
+def catalog_index_key(value, version, facet="brand"):
+    if facet == "brand" and value == "all":
+        return catalog_key(version, "all")
+    return catalog_key(version, f"{facet}:{value}")
+
+
+def product_facets(product):
+    facets = [("brand", product.brand), ("type", product.type), ("drop", product.is_drop)]
+    for season in product.season.split(", "):
+        facets.append(("season", season))
+    return facets
+
+
+# Команды записи одного товара со всеми его индексами в pipeline
+def queue_product_write(pipe, product, version):
+    product_key = product_key_for(product, version)
+    # Сохраняем товар одной строкой (product_model.Product.to_blob)
+    pipe.set(product_key, product.to_blob())
+    # Индексы для постраничного просмотра и поиска: score = id, чтобы порядок совпадал с сортировкой по id
+    pipe.zadd(catalog_index_key("all", version), {product_key: product.id})
+    for facet, value in product_facets(product):
+        pipe.zadd(catalog_index_key(value, version, facet), {product_key: product.id})
+    # Артикул -> ключ товара, чтобы искать по артикулу без SCAN (в ключе есть бренд)
+    pipe.hset(catalog_key(version, "arts"), product.art, product_key)
+
+
+# Команды удаления одного товара со всеми его индексами в pipeline
+def queue_product_delete(pipe, product, version):
+    product_key = product_key_for(product, version)
+    pipe.delete(product_key)
+    pipe.zrem(catalog_index_key("all", version), product_key)
+    for facet, value in product_facets(product):
+        pipe.zrem(catalog_index_key(value, version, facet), product_key)
+    pipe.hdel(catalog_key(version, "arts"), product.art)
+
+
+# Сколько товаров отправлять в redis одним pipeline при загрузке каталога
+CACHE_CHUNK_SIZE = 500
+
 # Кэш всего списка товаров
 # Кэширование товаров, брендов, сезонов для поиска в redis
-async def cache_products(products):
-    if products == []:
-        return
+# Товары пишутся пачками по chunk_size через pipeline: один round trip на пачку вместо нескольких на каждый товар
+# Возвращает False, если redis не ответил
+async def cache_products(products, chunk_size=CACHE_CHUNK_SIZE, version=None):
+    if version is None:
+        version = await get_catalog_version()
     unique_brands = set()
-    for product in products:
-        product_key = f"product:{product['brand']}:{product['art']}"
-        seasons = product["season"].split(", ")
-        # Сохраняем товар как хэш
+    for start in range(0, len(products), chunk_size):
         try:
-            await redis_client.hset(product_key, mapping=product)
-            unique_brands.add(product["brand"]) # Сохраняем бренд в множество брендов
-            for season in seasons:
-                await redis_client.hset(f"season:{season}:{product['art']}", mapping=product)  # Сохраняем артикул в отдельном множестве с сезоном
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for product in products[start:start + chunk_size]:
+                    queue_product_write(pipe, product, version)
+                    unique_brands.add(product.brand) # Сохраняем бренд в множество брендов
+                await pipe.execute()
         except Exception as e:
-            return
+            return False
             # await send_admin_message(f"Redis не отвечает (кэш products): {e}")
     brands = list(unique_brands)
     brands.sort()
-    key = "brands"
-    if await redis_client.exists(key):
-        await redis_client.delete(key)
-    await redis_client.rpush(key, *brands)
-    '''
-    keys = await redis_client.keys(f"product:*:*")
-    brands = set()
+    # Список брендов меняем в MULTI, чтобы он ни в какой момент не был пустым
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(catalog_key(version, "brands"))
+        if brands:
+            pipe.rpush(catalog_key(version, "brands"), *brands)
+        await pipe.execute()
+    return True
+
+
+# Полная пересборка каталога (старт бота, загрузка csv, конец дропа)
+# Новая версия собирается целиком, потом указатель переключается одной командой,
+# старая версия удаляется в фоне. Покупатели всё это время видят старый каталог целиком
+async def rebuild_catalog(products, chunk_size=CACHE_CHUNK_SIZE):
+    version = await redis_client.incr(CATALOG_NEXT_VERSION_KEY)
+    if not await cache_products(products, chunk_size=chunk_size, version=version):
+        await retire_catalog_version(version, delay=0)
+        return False
+    old_version = await redis_client.set(CATALOG_VERSION_KEY, version, get=True)
+    await announce_catalog_change()
+    if old_version is not None:
+        await retire_catalog_version(int(old_version))
+    return True
+
+
+# Снять версию с обслуживания: она запоминается в CATALOG_RETIRED_KEY и удаляется через delay секунд
+async def retire_catalog_version(version, delay=CATALOG_GC_DELAY):
+    await redis_client.zadd(CATALOG_RETIRED_KEY, {version: time.time() + delay})
+    schedule_catalog_gc(delay)
+
+
+def schedule_catalog_gc(delay=0):
+    task = asyncio.create_task(collect_catalog_garbage(delay))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+# Удаление отслуженных версий, срок которых вышел. Текущая версия не удаляется никогда
+async def collect_catalog_garbage(delay=0):
+    await asyncio.sleep(delay)
+    current = await get_catalog_version()
+    for version in await redis_client.zrangebyscore(CATALOG_RETIRED_KEY, "-inf", time.time()):
+        if int(version) != current:
+            await delete_catalog_version(int(version))
+        await redis_client.zrem(CATALOG_RETIRED_KEY, version)
+
+
+# При старте бота: удалить версии, снятые до перезапуска, и дождаться тех, чей срок ещё не вышел
+async def resume_catalog_gc():
+    await collect_catalog_garbage()
+    pending = await redis_client.zrange(CATALOG_RETIRED_KEY, -1, -1, withscores=True)
+    if pending:
+        schedule_catalog_gc(max(pending[0][1] - time.time(), 0))
+
+
+async def delete_catalog_version(version):
     cursor = 0
     while True:
-        cursor, keys = await redis_client.scan(cursor, match="product:*")
-        for key in keys:
-            parts = key.decode('utf-8').split(":")
-            if len(parts) >= 2:
-                brand = parts[1]
-                brands.add(brand)
+        cursor, keys = await redis_client.scan(cursor, match=catalog_key(version, "*"), count=1000)
+        if keys:
+            await redis_client.unlink(*keys)
         if cursor == 0:
             break
-    brands = list(brands)
-    print(brands)
-    '''
-
-# Получение товаров по бренду
-async def get_cached_products(brand):
-    cached_products = []
-    # ищем все ключи, соответствующие бренду
-    try:
-        if brand == "all":
-            brand_key = f"product:*:*"
-        else:
-            brand_key = f"product:{brand}:*"
-        cursor = 0
-        while True:
-            cursor, keys = await redis_client.scan(cursor, match=brand_key)
-            for key in keys:
-                product = await redis_client.hgetall(key)
-                product = {k.decode('utf-8'): v.decode('utf-8') for k, v in product.items()}
-                product["id"] = int(product["id"])
-                product["price"] = int(product["price"])
-                product["drop_price"] = int(product["drop_price"])
-                cached_products.append(product)
-            if cursor == 0:
-                break
-        products = sorted(cached_products, key=lambda item: int(item["id"]), reverse=True)
-        return products
-    except Exception as e:
-        # await send_admin_message(f"Redis не отвечает: {e}")
-        return []
 
-async def get_search_products(search_mode, param, sizes_cache=None):
-    cached_products = []
-    try:
-        if search_mode == "season":
-            cursor = 0
-            while True:
-                cursor, keys = await redis_client.scan(cursor, match=f"season:{param}:*")
-                for key in keys:
-                    product = await redis_client.hgetall(key)
-                    product = {k.decode('utf-8'): v.decode('utf-8') for k, v in product.items()}
-                    product["id"] = int(product["id"])
-                    product["price"] = int(product["price"])
-                    product["drop_price"] = int(product["drop_price"])
-                    cached_products.append(product)
-                if cursor == 0:
-                    break
-
-        if search_mode == "size":
-            size = param
-            arts = []
-            for art in sizes_cache:
-                for cache in sizes_cache[art]:
-                    if (size == cache) or ((size+" 2/3") == cache):
-                        arts.append(art)
-                        break
-            cursor = 0
-            for art in arts:
-                while True:
-                    cursor, keys = await redis_client.scan(cursor, match=f"product:*:{art}")
-                    for key in keys:
-                        product = await redis_client.hgetall(key)
-                        product = {k.decode('utf-8'): v.decode('utf-8') for k, v in product.items()}
-                        product["id"] = int(product["id"])
-                        product["price"] = int(product["price"])
-                        product["drop_price"] = int(product["drop_price"])
-                        cached_products.append(product)
-                    if cursor == 0:
-                        break
-
-        if search_mode == "art":
-            cursor = 0
-            while True:
-                cursor, keys = await redis_client.scan(cursor, match=f"product:*:{param}")
-                for key in keys:
-                    product = await redis_client.hgetall(key)
-                    product = {k.decode('utf-8'): v.decode('utf-8') for k, v in product.items()}
-                    product["id"] = int(product["id"])
-                    product["price"] = int(product["price"])
-                    product["drop_price"] = int(product["drop_price"])
-                    cached_products.append(product)
-                if cursor == 0:
-                    break
-
-        products = sorted(cached_products, key=lambda item: int(item["id"]), reverse=True)
-        return products
 
-    except Exception as e:
-        # await send_admin_message(f"Redis не отвечает: {e}")
+# Все товары индекса: ключи берём из sorted set, он уже отсортирован по id от новых к старым, товары - одним MGET
+async def get_index_products(index_key):
+    keys = await redis_client.zrevrange(index_key, 0, -1)
+    if not keys:
         return []
+    return decode_products(await redis_client.mget(keys))
+
 
+# Товары из строк redis. Пропускаются пропавшие ключи и строки старой схемы (from_blob возвращает None)
+def decode_products(blobs):
+    products = []
+    for blob in blobs:
+        product = product_model.from_blob(blob) if blob else None
+        if product is not None:
+            products.append(product)
+    return products
 
-async def get_redis_brands():
-    brands = await redis_client.lrange("brands", 0, -1)
-    return brands
 
+# Артикулы, у которых сейчас есть размер (по индексу sizes:*)
+async def get_size_arts(size):
+    arts = await redis_client.smembers(f"sizes:{size_model.size_key(size) or size}")
+    return [art.decode('utf-8') for art in arts]
 
-async def upload_user_index_brand(user_id, current_index, brand, watch_mode, back_mode="0"):
+
+# Сколько живут снимки списков, которые листают пользователи (продлевается при каждом обращении).
+# Позиция пользователя index:{user} не истекает: по ней работают кнопки всех его старых карточек
+NAV_TTL = 24 * 60 * 60
+
+
+# Позиция пользователя в списке товаров. art - артикул открытого товара, по нему выполняются действия с товаром,
+# snapshot - ключ снимка списка (save_nav_snapshot). Поля, которые не переданы, остаются прежними
+async def upload_user_index_brand(user_id, current_index, brand, watch_mode, back_mode="0", art=None, snapshot=None):
     index_key = f"index:{user_id}"
     index = {"current_index": current_index, "brand": brand, "watch_mode": watch_mode, "back_mode": back_mode}
+    if art is not None:
+        index["art"] = art
+    if snapshot is not None:
+        index["snapshot"] = snapshot
     await redis_client.hset(index_key, mapping=index)
 
+
+# Снимок списка товаров, который листает пользователь: артикулы по порядку на момент открытия списка.
+# Ключ зависит только от содержимого, поэтому одинаковые списки у разных пользователей хранятся один раз
+async def save_nav_snapshot(key, arts):
+    await redis_client.set(f"nav:{key}", "\n".join(arts), ex=NAV_TTL)
+
+
+async def get_nav_snapshot(key):
+    arts = await redis_client.getex(f"nav:{key}", ex=NAV_TTL)
+    if arts is None:
+        return None
+    return arts.decode('utf-8').split("\n") if arts else []
+
 async def get_brand_and_index(user_id):
     index = await redis_client.hgetall(f"index:{user_id}")
     index = {k.decode('utf-8'): v.decode('utf-8') for k, v in index.items()}
     return index
 
+# Удаление всех версий каталога. Служебные ключи (CATALOG_CONTROL_KEYS) остаются: счётчик версий не начинается заново
 async def redis_delete_all_products():
     keys_to_delete = []
     cursor = 0
     while True:
-        cursor, keys = await redis_client.scan(cursor, match="product:*:*")
+        cursor, keys = await redis_client.scan(cursor, match="catalog:*")
         for key in keys:
-            keys_to_delete.append(key)
+            if key.decode('utf-8') not in CATALOG_CONTROL_KEYS:
+                keys_to_delete.append(key)
         if cursor == 0:
             break
     if keys_to_delete:
         await redis_client.delete(*keys_to_delete)
+    await announce_catalog_change()
+
+# Обновление одного товара в кэше (цена, ссылка на пост и т.д.) без пересборки каталога
+# old_product - товар в том виде, в котором он лежит в кэше сейчас: по нему убираются устаревшие ключи,
+# если поменялся бренд или сезоны
+async def update_cached_product(product, old_product=None):
+    version = await get_catalog_version()
+    async with redis_client.pipeline(transaction=True) as pipe:
+        # Удаление и запись идут в одном MULTI, поэтому покупатели не увидят товар пропавшим
+        if old_product is not None:
+            queue_product_delete(pipe, old_product, version)
+        queue_product_write(pipe, product, version)
+        await pipe.execute()
+    brands_key = catalog_key(version, "brands")
+    brands = await redis_client.lrange(brands_key, 0, -1)
+    if product.brand.encode('utf-8') not in brands:
+        brands = sorted([brand.decode('utf-8') for brand in brands] + [product.brand])
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(brands_key)
+            pipe.rpush(brands_key, *brands)
+            await pipe.execute()
+    if old_product is not None and old_product.brand != product.brand:
+        await remove_brand_if_empty(old_product.brand, version)
+    await announce_catalog_change()
+
+
+# Удаление одного товара из кэша: хэш товара, записи сезонов, индексы каталога и бренд, если товаров бренда не осталось
+async def redis_delete_product(product):
+    version = await get_catalog_version()
+    async with redis_client.pipeline(transaction=True) as pipe:
+        queue_product_delete(pipe, product, version)
+        await pipe.execute()
+    await remove_brand_if_empty(product.brand, version)
+    await announce_catalog_change()
+
+
+async def remove_brand_if_empty(brand, version):
+    if await redis_client.zcard(catalog_index_key(brand, version)) == 0:
+        await redis_client.lrem(catalog_key(version, "brands"), 0, brand)
+
+
+# Обратный индекс размеров: sizes:{ключ размера} -> множество артикулов, где этот размер сейчас есть.
+# Ключи берутся из size_model: "42 2/3" ищется и как "42 2/3", и как "42", "40-41" - как "41"
+def size_keys_for(sizes):
+    keys = set()
+    for size in size_model.parse_sizes(sizes):
+        keys |= size_model.search_keys(size)
+    return keys
+
+
+# Применение результата парсинга: changes = {артикул: (старые размеры, новые размеры)}
+# Трогаются только изменившиеся пары размер-артикул, всё одним pipeline
+async def update_sizes_index(changes):
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for art, (old_sizes, new_sizes) in changes.items():
+            old_keys = size_keys_for(old_sizes)
+            new_keys = size_keys_for(new_sizes)
+            for key in old_keys - new_keys:
+                pipe.srem(f"sizes:{key}", art)
+            for key in new_keys - old_keys:
+                pipe.sadd(f"sizes:{key}", art)
+        await pipe.execute()
+
+
+# Полная пересборка индекса размеров из sizes_cache (при старте бота)
+async def rebuild_sizes_index(sizes_cache):
     keys_to_delete = []
     cursor = 0
     while True:
-        cursor, keys = await redis_client.scan(cursor, match="season:*:*")
-        for key in keys:
-            keys_to_delete.append(key)
+        cursor, keys = await redis_client.scan(cursor, match="sizes:*")
+        keys_to_delete.extend(keys)
         if cursor == 0:
             break
-    if keys_to_delete:
-        await redis_client.delete(*keys_to_delete)
-    await redis_client.delete("brands")
+    async with redis_client.pipeline(transaction=True) as pipe:
+        if keys_to_delete:
+            pipe.delete(*keys_to_delete)
+        for art, sizes in sizes_cache.items():
+            for key in size_keys_for(sizes):
+                pipe.sadd(f"sizes:{key}", art)
+        await pipe.execute()
+
+
+# Поток изменений наличия: каждая запись - какие размеры у товара появились и какие пропали.
+# Хранится в redis stream (не в sizes:*, чтобы его не стёр rebuild_sizes_index), старые записи обрезаются.
+# Читатели (уведомления о поступлении) работают через группу: непрочитанное и неподтверждённое переживает перезапуск
+SIZES_STREAM_KEY = "changes:sizes"
+SIZES_STREAM_MAXLEN = 10000
+
+
+async def add_sizes_change(art, added, removed):
+    await redis_client.xadd(SIZES_STREAM_KEY, {"art": art, "added": json.dumps(added), "removed": json.dumps(removed)},
+                            maxlen=SIZES_STREAM_MAXLEN, approximate=True)
+
+
+async def create_sizes_group(group):
+    try:
+        await redis_client.xgroup_create(SIZES_STREAM_KEY, group, id="$", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e): # группа уже есть
+            raise
+
+
+# Записи потока для группы: [(id, {"art", "added", "removed"})]. last_id="0" - выданные раньше, но не подтверждённые,
+# ">" - новые. block - сколько мс ждать новых записей, None - не ждать
+async def read_sizes_changes(group, consumer, last_id=">", count=100, block=None):
+    response = await redis_client.xreadgroup(group, consumer, {SIZES_STREAM_KEY: last_id}, count=count, block=block)
+    changes = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            if not fields: # запись уже обрезана по SIZES_STREAM_MAXLEN
+                changes.append((entry_id, None))
+                continue
+            changes.append((entry_id, {"art": fields[b"art"].decode("utf-8"),
+                                       "added": json.loads(fields[b"added"]),
+                                       "removed": json.loads(fields[b"removed"])}))
+    return changes
+
 
-async def redis_delete_product(art):
-    await redis_client.delete(f"product:*:{art}")
+async def ack_sizes_changes(group, ids):
+    if ids:
+        await redis_client.xack(SIZES_STREAM_KEY, group, *ids)
 
 
 # Кэширование доп фоток
@@ -233,7 +433,10 @@ async def cache_sizes_length():
         data = json.load(f)
         for dick in data:
             key = f"length:{dick['art']}"
-            await redis_client.hset(key, mapping=dick['sizes'])
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(key) # старые размеры артикула (и ключ, который мог остаться строкой) не остаются
+                pipe.hset(key, mapping=dick['sizes'])
+                await pipe.execute()
 
 # Поиск длин размеров по артикулу
 async def get_sizes_length(art):
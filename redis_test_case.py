@@ -0,0 +1,55 @@
+# Общее для тестов с redis: отдельная база REDIS_TEST_DB, очищается перед каждым тестом и после него,
+# redis_nikix.redis_client подменяется на неё. Без локального redis тесты пропускаются
+import logging
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("BOT_TOKEN", "123456:ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghi")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("CHAT_ORDERS_ID", "0")
+
+import redis.asyncio as redis
+
+import catalog_engine
+import product_model
+import redis_nikix
+
+REDIS_TEST_DB = 14
+
+
+def make_product(id, brand="Nike"):
+    return product_model.Product(id, "sneaker", f"Sneaker {id}", "Китай", "кожа", "лето", brand, 10000 + id,
+                                 f"A{id}", "photo", "0", "anki", 0, 0)
+
+
+# main при импорте пишет лог в bot.log в текущей папке; в тестах лог только в консоль
+def import_main():
+    with mock.patch("logging.handlers.RotatingFileHandler", lambda *args, **kwargs: logging.NullHandler()):
+        import main
+    return main
+
+
+class RedisTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = redis.Redis(host='localhost', port=6379, db=REDIS_TEST_DB)
+        try:
+            await self.client.ping()
+        except redis.ConnectionError:
+            self.skipTest("нет локального redis")
+        await self.client.flushdb()
+        self.patch(redis_nikix, "redis_client", self.client)
+        catalog_engine.revision = None # ревизия в очищенной базе начинается заново
+
+    async def asyncTearDown(self):
+        for task in list(redis_nikix.background_tasks):
+            task.cancel()
+        redis_nikix.background_tasks.clear()
+        await self.client.flushdb()
+        await self.client.aclose()
+
+    # Подмена на время теста, снимается после asyncTearDown
+    def patch(self, target, attribute, value):
+        patcher = mock.patch.object(target, attribute, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
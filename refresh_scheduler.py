@@ -0,0 +1,163 @@
+# Планировщик обновления размеров: каждому артикулу свой интервал проверки вместо общего круга раз в 40-80 минут.
+# Чаще проверяются товары, которые смотрят и кладут в корзину, у которых размеры часто меняются, и дроп.
+# Все проверки укладываются в общий бюджет запросов в час
+import json
+import math
+import random
+import time
+
+BASE_INTERVAL = 60 * 60 # обычный товар - раз в час
+MIN_INTERVAL = 10 * 60
+MAX_INTERVAL = 6 * 60 * 60
+HOURLY_BUDGET = 600 # запросов к anki в час, можно переопределить в bot_settings.json (parser_hourly_budget)
+BURST_MINUTES = 5 # сколько неизрасходованного бюджета можно накопить, в минутах
+TICK = 60 # как часто update_cache спрашивает, кого пора проверить
+
+HEAT_HALF_LIFE = 3 * 60 * 60 # за 3 часа интерес к товару остывает вдвое
+VIEW_WEIGHT = 1
+BASKET_WEIGHT = 5
+CHANGE_ALPHA = 0.2 # вес последней проверки в доле проверок, на которых размеры поменялись
+DROP_FACTOR = 2
+
+STATS_PATH = "refresh_stats.json"
+
+# art -> {"url", "is_drop", "heat", "heat_time", "change_rate", "last_check", "jitter", "failed"}
+items = {}
+tokens = None
+tokens_time = 0
+
+
+def new_item(url, is_drop, last_check):
+    return {"url": url, "is_drop": is_drop, "heat": 0, "heat_time": 0, "change_rate": 0.5,
+            "last_check": last_check, "jitter": random.uniform(0.9, 1.1), "failed": False}
+
+
+# Список товаров из базы: новые добавляются, удалённые забываются.
+# Товары, размеры которых уже есть в кэше (known), не проверяются сразу: их первая проверка разбрасывается
+# по их интервалу (last_check = None), чтобы после перезапуска не проверять всё разом
+def sync_products(urls, known=()):
+    arts = set()
+    for sneaker in urls:
+        art = sneaker["art"]
+        arts.add(art)
+        item = items.get(art)
+        if item is None:
+            last_check = None if art in known else 0
+            items[art] = new_item(sneaker["url"], bool(sneaker.get("is_drop")), last_check)
+        else:
+            item["url"] = sneaker["url"]
+            item["is_drop"] = bool(sneaker.get("is_drop"))
+    for art in list(items):
+        if art not in arts:
+            del items[art]
+
+
+def current_heat(item, now):
+    return item["heat"] * 0.5 ** ((now - item["heat_time"]) / HEAT_HALF_LIFE)
+
+
+def add_heat(art, weight):
+    item = items.get(art)
+    if item is None:
+        return
+    now = time.time()
+    item["heat"] = current_heat(item, now) + weight
+    item["heat_time"] = now
+
+
+def record_view(art):
+    add_heat(art, VIEW_WEIGHT)
+
+
+def record_basket_add(art):
+    add_heat(art, BASKET_WEIGHT)
+
+
+# Итог проверки: changed - поменялись ли размеры, failed - проверить не удалось (тогда повтор через MIN_INTERVAL)
+def record_result(art, changed=False, failed=False):
+    item = items.get(art)
+    if item is None:
+        return
+    item["last_check"] = time.time()
+    item["jitter"] = random.uniform(0.9, 1.1)
+    item["failed"] = failed
+    if not failed:
+        item["change_rate"] = (1 - CHANGE_ALPHA) * item["change_rate"] + CHANGE_ALPHA * (1 if changed else 0)
+
+
+def priority(item, now):
+    heat_factor = 1 + math.log1p(current_heat(item, now)) # первые просмотры важнее сотого
+    change_factor = 0.5 + 1.5 * item["change_rate"] # от 0.5 (никогда не меняется) до 2 (меняется каждый раз)
+    drop_factor = DROP_FACTOR if item["is_drop"] else 1
+    return heat_factor * change_factor * drop_factor
+
+
+# Интервалы всех товаров. Если вместе они требуют больше запросов, чем бюджет, все растягиваются в одинаковое число раз
+def intervals(now, budget):
+    result = {art: min(max(BASE_INTERVAL / priority(item, now), MIN_INTERVAL), MAX_INTERVAL) for art, item in items.items()}
+    needed = sum(3600 / interval for interval in result.values())
+    if needed > budget:
+        scale = needed / budget
+        result = {art: interval * scale for art, interval in result.items()}
+    return result
+
+
+def read_budget():
+    try:
+        with open("bot_settings.json", "r") as f:
+            return json.load(f).get("parser_hourly_budget", HOURLY_BUDGET)
+    except FileNotFoundError:
+        return HOURLY_BUDGET
+
+
+# Товары, которых пора проверить: [{"art", "url"}], самые просроченные первыми.
+# Сверху ограничено накопленными запросами: бюджет пополняется равномерно, запас не больше чем на BURST_MINUTES
+def due_urls(budget=None):
+    global tokens, tokens_time
+    budget = budget or read_budget()
+    now = time.time()
+    burst = budget * BURST_MINUTES / 60
+    if tokens is None:
+        tokens = burst
+    else:
+        tokens = min(burst, tokens + (now - tokens_time) * budget / 3600)
+    tokens_time = now
+
+    due = []
+    for art, interval in intervals(now, budget).items():
+        item = items[art]
+        wait = MIN_INTERVAL if item["failed"] else interval * item["jitter"]
+        if item["last_check"] is None:
+            item["last_check"] = now - random.uniform(0, wait)
+        overdue = (now - item["last_check"]) / wait
+        if overdue >= 1:
+            due.append((overdue, art))
+    due.sort(reverse=True)
+    due = due[:int(tokens)]
+    tokens -= len(due)
+    return [{"art": art, "url": items[art]["url"]} for _, art in due]
+
+
+# Сводка для отчёта: сколько товаров в какой частоте и сколько запросов в час это требует
+def schedule_stats(budget=None):
+    budget = budget or read_budget()
+    now = time.time()
+    result = intervals(now, budget)
+    return {"products": len(result), "budget": budget,
+            "needed": round(sum(3600 / interval for interval in result.values())),
+            "hot": sum(1 for interval in result.values() if interval <= 20 * 60),
+            "cold": sum(1 for interval in result.values() if interval >= 3 * 60 * 60)}
+
+
+def save_stats():
+    with open(STATS_PATH, "w") as f:
+        json.dump(items, f)
+
+
+def load_stats():
+    global items
+    try:
+        with open(STATS_PATH, "r") as f:
+            items = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        items = {}
@@ -0,0 +1,8 @@
+# Точка входа бота: python run_bot.py
+# Здесь нет ничего, кроме запуска: процессы разбора страниц (parserAnki.start_parse_pool) создаются через spawn
+# и заново импортируют модуль запуска как __mp_main__. main импортируется только под __main__, поэтому
+# в них не создаются второй Bot и Dispatcher и не открывается ещё один обработчик bot.log
+if __name__ == '__main__':
+    import main
+
+    main.run()
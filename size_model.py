@@ -0,0 +1,73 @@
+# Единое представление размера. С сайта размеры приходят строками вида "42", "42 2/3", "40-41", "42,5",
+# здесь из строки один раз получается Size:
+#   key   - канонический ключ, по нему сравниваются размеры, строится индекс в redis и кнопки поиска ("42 2/3", "41")
+#   value - число для сортировки (42.667; у диапазона "40-41" - верхняя граница, 41)
+#   label - как размер показывается покупателю, исходная строка без лишних пробелов
+import re
+from collections import namedtuple
+from fractions import Fraction
+from functools import lru_cache
+
+Size = namedtuple("Size", ["key", "value", "label"])
+
+NUMBER = r"(\d+(?:[.,]\d+)?)(?:\s*(\d)/(\d)|\s*([½⅓⅔]))?"
+RANGE_RE = re.compile(rf"{NUMBER}\s*[-–—]\s*{NUMBER}")
+SIZE_RE = re.compile(NUMBER)
+WHITESPACE_RE = re.compile(r"\s+")
+UNICODE_FRACTIONS = {"½": Fraction(1, 2), "⅓": Fraction(1, 3), "⅔": Fraction(2, 3)}
+
+
+def to_fraction(whole, numerator, denominator, symbol):
+    value = Fraction(whole.replace(",", "."))
+    if numerator and int(denominator):
+        value += Fraction(int(numerator), int(denominator))
+    elif symbol:
+        value += UNICODE_FRACTIONS[symbol]
+    return value
+
+
+# 42 -> "42", 42 2/3 -> "42 2/3", 42.5 -> "42 1/2"
+def format_key(value):
+    value = value.limit_denominator(12)
+    whole = value.numerator // value.denominator
+    rest = value - whole
+    if rest == 0:
+        return str(whole)
+    return f"{whole} {rest.numerator}/{rest.denominator}"
+
+
+# Size из строки с сайта, None если в строке нет размера ("Не удалось проверить наличие")
+@lru_cache(maxsize=4096)
+def parse_size(label):
+    label = WHITESPACE_RE.sub(" ", label).strip()
+    match = RANGE_RE.search(label)
+    if match:
+        value = to_fraction(*match.groups()[4:])
+    else:
+        match = SIZE_RE.search(label)
+        if not match:
+            return None
+        value = to_fraction(*match.groups())
+    return Size(format_key(value), float(value), label)
+
+
+def parse_sizes(labels):
+    sizes = []
+    for label in labels:
+        size = parse_size(label)
+        if size is not None:
+            sizes.append(size)
+    return sizes
+
+
+def size_key(label):
+    size = parse_size(label)
+    return size.key if size is not None else None
+
+
+# Под какими ключами размер ищется: свой ключ и, для дробных, целый размер (по кнопке "42" находятся и "42 2/3")
+def search_keys(size):
+    keys = {size.key}
+    if size.value != int(size.value):
+        keys.add(str(int(size.value)))
+    return keys
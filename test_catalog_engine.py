@@ -0,0 +1,75 @@
+# Каталог в памяти: страницы и позиции как в индексах redis, перечитывание по ревизии
+# Запуск: python -m unittest test_catalog_engine
+# Нужен локальный redis, используется отдельная база 14, она очищается перед каждым тестом
+import asyncio
+import unittest
+from unittest import mock
+
+import catalog_engine
+import redis_nikix
+from redis_test_case import RedisTestCase, make_product
+
+
+class CatalogEngineTest(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        products = [make_product(1, "Nike"), make_product(2, "Adidas"), make_product(3, "Nike")]
+        await redis_nikix.rebuild_catalog(products)
+        await catalog_engine.reload()
+
+    def test_pages_and_positions(self):
+        self.assertEqual([product.art for product in catalog_engine.get_products("all")], ["A3", "A2", "A1"])
+        self.assertEqual(catalog_engine.brands, ["Adidas", "Nike"])
+        product, position, total = catalog_engine.get_page("Nike", -1)
+        self.assertEqual((product.art, position, total), ("A1", 1, 2))
+        product, position, _ = catalog_engine.get_page("Nike", 2) # за концом списка - первый
+        self.assertEqual((product.art, position), ("A3", 0))
+        self.assertEqual(catalog_engine.get_page("Puma", 0), (None, 0, 0))
+        product, position, total = catalog_engine.get_position("all", "A2")
+        self.assertEqual((product.art, position, total), ("A2", 1, 3))
+        self.assertEqual(catalog_engine.get_position("Nike", "A2"), (None, 0, 0))
+        self.assertEqual([product.art for product in catalog_engine.get_by_arts(["A1", "X", "A3"])], ["A3", "A1"])
+        self.assertEqual([product.art for product in catalog_engine.get_products("лето", facet="season")],
+                         ["A3", "A2", "A1"])
+
+    async def test_refresh_follows_revision(self):
+        await redis_nikix.update_cached_product(make_product(2, "Puma"), old_product=make_product(2, "Adidas"))
+        self.assertEqual(catalog_engine.get_product("A2").brand, "Adidas") # ещё не перечитан
+        await catalog_engine.refresh()
+        self.assertEqual(catalog_engine.get_product("A2").brand, "Puma")
+        self.assertEqual(catalog_engine.brands, ["Nike", "Puma"])
+
+    async def test_concurrent_reloads_keep_newest_revision(self):
+        load = redis_nikix.get_index_products
+        first_read = asyncio.Event()
+        calls = 0
+
+        # Первая загрузка прочитала товары, но медлит со сборкой; тем временем каталог меняется
+        async def slow_load(index_key):
+            nonlocal calls
+            calls += 1
+            products = await load(index_key)
+            if calls == 1:
+                first_read.set()
+                await asyncio.sleep(0.05)
+            return products
+
+        catalog_engine.revision = None
+        with mock.patch.object(redis_nikix, "get_index_products", slow_load):
+            slow = asyncio.create_task(catalog_engine.reload())
+            await first_read.wait()
+            await redis_nikix.rebuild_catalog([make_product(4)])
+            await catalog_engine.reload()
+            await slow
+        self.assertEqual(catalog_engine.revision, await redis_nikix.get_catalog_revision())
+        self.assertEqual([product.art for product in catalog_engine.get_products("all")], ["A4"])
+
+    async def test_older_revision_is_not_loaded(self):
+        loaded = catalog_engine.records
+        catalog_engine.revision = await redis_nikix.get_catalog_revision() + 5
+        await catalog_engine.reload()
+        self.assertIs(catalog_engine.records, loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
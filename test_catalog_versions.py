@@ -0,0 +1,75 @@
+# Версии каталога в redis: переключение, отложенное удаление старых версий и redis_delete_all_products
+# Запуск: python -m unittest test_catalog_versions
+# Нужен локальный redis, используется отдельная база 14, она очищается перед каждым тестом
+import time
+import unittest
+from unittest import mock
+
+import redis_nikix
+from redis_test_case import RedisTestCase, make_product
+
+
+class CatalogVersionsTest(RedisTestCase):
+    async def version_keys(self, version):
+        return [key async for key in self.client.scan_iter(match=redis_nikix.catalog_key(version, "*"))]
+
+    # Как будто прошло CATALOG_GC_DELAY секунд
+    async def collect_later(self):
+        with mock.patch.object(redis_nikix.time, "time", return_value=time.time() + redis_nikix.CATALOG_GC_DELAY + 1):
+            await redis_nikix.collect_catalog_garbage()
+
+    async def test_rebuild_switches_and_collects_old_version(self):
+        await redis_nikix.rebuild_catalog([make_product(1)])
+        first = await redis_nikix.get_catalog_version()
+        await redis_nikix.rebuild_catalog([make_product(1), make_product(2)])
+        second = await redis_nikix.get_catalog_version()
+        self.assertNotEqual(first, second)
+
+        await redis_nikix.collect_catalog_garbage() # срок ещё не вышел
+        self.assertTrue(await self.version_keys(first))
+        await self.collect_later()
+        self.assertEqual(await self.version_keys(first), [])
+        self.assertEqual(await self.client.zcard(redis_nikix.CATALOG_RETIRED_KEY), 0)
+        products = await redis_nikix.get_index_products(redis_nikix.catalog_index_key("all", second))
+        self.assertEqual([product.art for product in products], ["A2", "A1"])
+
+    async def test_delete_all_keeps_counter_and_new_catalog(self):
+        await redis_nikix.rebuild_catalog([make_product(1)])
+        await redis_nikix.rebuild_catalog([make_product(2)]) # версия 1 ждёт удаления
+        await redis_nikix.redis_delete_all_products()
+        for key in (redis_nikix.CATALOG_VERSION_KEY, redis_nikix.CATALOG_NEXT_VERSION_KEY,
+                    redis_nikix.CATALOG_RETIRED_KEY):
+            self.assertTrue(await self.client.exists(key), key)
+
+        await redis_nikix.rebuild_catalog([make_product(3)])
+        version = await redis_nikix.get_catalog_version()
+        self.assertEqual(version, 3) # номер не повторяет ни одну из прежних версий
+        await self.collect_later()
+        products = await redis_nikix.get_index_products(redis_nikix.catalog_index_key("all", version))
+        self.assertEqual([product.art for product in products], ["A3"])
+
+    async def test_resume_collects_versions_retired_before_restart(self):
+        await redis_nikix.rebuild_catalog([make_product(1)])
+        await redis_nikix.rebuild_catalog([make_product(2)])
+        for task in list(redis_nikix.background_tasks): # перезапуск: отложенные задачи пропали
+            task.cancel()
+        redis_nikix.background_tasks.clear()
+
+        await redis_nikix.resume_catalog_gc()
+        self.assertTrue(await self.version_keys(1)) # срок ещё не вышел - удаление снова запланировано
+        self.assertEqual(len(redis_nikix.background_tasks), 1)
+        with mock.patch.object(redis_nikix.time, "time", return_value=time.time() + redis_nikix.CATALOG_GC_DELAY + 1):
+            await redis_nikix.resume_catalog_gc()
+        self.assertEqual(await self.version_keys(1), [])
+        self.assertTrue(await self.version_keys(2))
+
+    async def test_current_version_is_never_collected(self):
+        await redis_nikix.rebuild_catalog([make_product(1)])
+        version = await redis_nikix.get_catalog_version()
+        await redis_nikix.retire_catalog_version(version, delay=0)
+        await redis_nikix.collect_catalog_garbage()
+        self.assertTrue(await self.version_keys(version))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# Варианты разбора страницы (parserAnki.EXTRACTORS) против исходного разбора из get_sizes.
+# Страницы: сгенерированный набор из bench_extract, краевые случаи ниже и сохранённые страницы anki
+# из папки ANKI_PAGES (*.html, как для bench_extract.py), если она есть.
+# Запуск: python -m unittest test_extract_parity
+import os
+import unittest
+
+import bench_extract
+import parserAnki
+
+ANKI_PAGES = os.environ.get("ANKI_PAGES", "anki_pages")
+
+# Допустимые страницы, на которых lxml расходится с исходным разбором
+EDGE_CASES = {
+    "textarea": '<textarea><input type="radio" id="s"><label for="s"><span>41</span></label></textarea>'
+                '<input type="radio" id="s"><label for="s"><span>55</span></label>',
+    "label-in-textarea": '<input type="radio" id="s"><textarea><label for="s"><span>41</span></label></textarea>'
+                         '<label for="s"><span>55</span></label>',
+    "label-in-title": '<title><label for="a"><span>40</span></label></title>'
+                      '<input type="radio" id="a"><label for="a"><span>41</span></label>',
+    "duplicate-id": '<input type="radio" id="a" id="b"><label for="a"><span>41</span></label>'
+                    '<label for="b"><span>42</span></label>',
+    "duplicate-for": '<input type="radio" id="a"><label for="b" for="a"><span>41</span></label>',
+    "lone-surrogate": '<input type="radio" id="a"><label for="a"><span>41\ud800</span></label>'
+                      '<input type="radio" id="b"><label for="b"><span>42</span></label>',
+}
+
+
+def corpus():
+    pages = bench_extract.make_corpus()
+    pages.update(EDGE_CASES)
+    if os.path.isdir(ANKI_PAGES):
+        pages.update(bench_extract.load_saved(ANKI_PAGES))
+    return pages
+
+
+class ExtractParityTest(unittest.TestCase):
+    def assert_matches_original(self, backend):
+        extractor = parserAnki.EXTRACTORS[backend]
+        for name, html in corpus().items():
+            with self.subTest(page=name):
+                self.assertEqual(bench_extract.run(extractor, html), bench_extract.run(bench_extract.extract_sizes_original, html))
+
+    def test_default_extractor(self):
+        self.assert_matches_original(parserAnki.DEFAULT_EXTRACTOR)
+
+    def test_bs4(self):
+        self.assert_matches_original("bs4")
+
+    def test_scan(self):
+        self.assert_matches_original("scan")
+
+    def test_extract_sizes_uses_default(self):
+        self.assertEqual(parserAnki.extract_sizes(EDGE_CASES["duplicate-id"]), ["42"])
+
+    # lxml включается явно, только когда совпадёт на всех страницах
+    @unittest.skipUnless("lxml" in parserAnki.EXTRACTORS, "lxml не установлен")
+    def test_lxml_is_not_default_while_it_differs(self):
+        differs = [name for name, html in corpus().items()
+                   if bench_extract.run(parserAnki.EXTRACTORS["lxml"], html)
+                   != bench_extract.run(bench_extract.extract_sizes_original, html)]
+        if differs:
+            self.assertNotEqual(parserAnki.DEFAULT_EXTRACTOR, "lxml", differs)
+
+
+if __name__ == '__main__':
+    unittest.main()
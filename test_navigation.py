@@ -0,0 +1,92 @@
+# Навигация по снимку списка: действия с товаром попадают в тот артикул, который открыт у пользователя,
+# даже если каталог под ним поменялся, и ссылки на товар (поиск по артикулу, корзина) запоминают его.
+# Запуск: python -m unittest test_navigation
+# Нужен локальный redis, используется отдельная база 14, она очищается перед каждым тестом
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import catalog_engine
+import redis_nikix
+from redis_test_case import RedisTestCase, import_main, make_product
+
+main = import_main()
+
+USER_ID = 42
+
+
+def make_message(text=""):
+    return SimpleNamespace(text=text, message_id=1, chat=SimpleNamespace(id=USER_ID),
+                           from_user=SimpleNamespace(id=USER_ID, username=None, first_name="Гость"))
+
+
+class NavigationTest(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.patch(main, "bot", mock.AsyncMock())
+        self.patch(main, "send_or_update_product", mock.AsyncMock())
+        main.nav_snapshots.clear()
+        self.products = [make_product(id) for id in range(1, 6)]
+        await self.set_catalog(self.products)
+
+    async def set_catalog(self, products):
+        await redis_nikix.rebuild_catalog(products)
+        await catalog_engine.reload()
+
+    async def index_product(self):
+        return (await main.get_index_product(await redis_nikix.get_brand_and_index(USER_ID)))[0]
+
+    async def test_action_hits_pinned_art_after_catalog_change(self):
+        await main.open_listing(USER_ID, catalog_engine.get_products("all"), 1, brand="all", watch_mode="catalog")
+        self.assertEqual((await self.index_product()).art, "A4")
+        self.assertEqual(await self.client.ttl(f"index:{USER_ID}"), -1) # позиция не истекает
+
+        await self.set_catalog(self.products + [make_product(9)]) # новый товар сдвинул все позиции
+        self.assertNotEqual(catalog_engine.get_page("all", 1)[0].art, "A4")
+        self.assertEqual((await self.index_product()).art, "A4")
+
+    async def test_paging_skips_deleted_products(self):
+        await main.open_listing(USER_ID, catalog_engine.get_products("all"), 0, brand="all", watch_mode="catalog")
+        await redis_nikix.redis_delete_product(catalog_engine.get_product("A4"))
+        await catalog_engine.refresh()
+        index = await redis_nikix.get_brand_and_index(USER_ID)
+        product, position, total = await main.get_product_from_index("catalog", "all", 1, snapshot=index["snapshot"])
+        self.assertEqual((product.art, position, total), ("A3", 2, 5))
+        product, position, _ = await main.get_product_from_index("catalog", "all", 1, snapshot=index["snapshot"], step=-1)
+        self.assertEqual((product.art, position), ("A5", 0))
+
+    async def test_art_position_comes_from_snapshot(self):
+        await main.open_listing(USER_ID, catalog_engine.get_products("all"), 0, brand="all", watch_mode="catalog")
+        index = await redis_nikix.get_brand_and_index(USER_ID)
+        main.nav_snapshots.clear()
+        product, position, total = await main.get_product_from_index("catalog", "all", 0, art="A2",
+                                                                     snapshot=index["snapshot"])
+        self.assertEqual((product.art, position, total), ("A2", 3, 5))
+        self.assertEqual(main.nav_snapshots[index["snapshot"]][1]["A2"], 3)
+        product, position, _ = await main.get_product_from_index("catalog", "Nike", 0, art="A1")
+        self.assertEqual((product.art, position), ("A1", 4))
+
+    async def test_snapshot_survives_restart(self):
+        await main.open_listing(USER_ID, catalog_engine.get_products("all"), 2, brand="all", watch_mode="catalog")
+        main.nav_snapshots.clear() # другой процесс бота или перезапуск
+        await self.set_catalog(self.products + [make_product(9)])
+        self.assertEqual((await self.index_product()).art, "A3")
+
+    async def test_art_search_pins_found_product(self):
+        await main.open_listing(USER_ID, catalog_engine.get_products("all"), 0, brand="all", watch_mode="catalog")
+        await main.get_art_from_message(make_message(" a2 "), mock.AsyncMock())
+        self.assertEqual((await self.index_product()).art, "A2")
+        index = await redis_nikix.get_brand_and_index(USER_ID)
+        self.assertEqual(index["back_mode"], "search_from_art")
+
+    async def test_basket_link_pins_product(self):
+        await main.open_listing(USER_ID, catalog_engine.get_products("all"), 0, brand="all", watch_mode="catalog")
+        command = SimpleNamespace(args="A2zov7zovbasketzov3")
+        await main.start(make_message(), command, mock.AsyncMock())
+        self.assertEqual((await self.index_product()).art, "A2")
+        index = await redis_nikix.get_brand_and_index(USER_ID)
+        self.assertEqual((index["current_index"], index["back_mode"]), ("3", "basket"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# Предохранитель сайта в parserAnki.fetch_with_retry: пробный запрос не блокирует сайт навсегда,
+# ошибки прокси не останавливают запросы к живому сайту.
+# Запуск: python -m unittest test_parser_breaker
+# Сеть не нужна: request_page подменяется
+import asyncio
+import unittest
+from unittest import mock
+
+import parserAnki
+
+URL = "https://anki.team/product/A1"
+HOST = "anki.team"
+
+
+class BreakerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        parserAnki.breakers.clear()
+        self.patchers = [mock.patch.object(parserAnki, "RETRY_BASE_DELAY", 0),
+                         mock.patch.object(parserAnki, "pick_proxy", lambda: "http://proxy")]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        parserAnki.breakers.clear()
+        parserAnki.proxies.clear()
+
+    def open_breaker(self):
+        breaker = parserAnki.get_breaker(HOST)
+        breaker.update(failures=parserAnki.BREAKER_FAILURES, open_until=0, opened=1)
+
+    async def fetch(self, responses):
+        with mock.patch.object(parserAnki, "request_page", mock.AsyncMock(side_effect=responses)):
+            return await parserAnki.fetch_with_retry(None, URL)
+
+    async def test_proxy_errors_do_not_open_breaker(self):
+        for _ in range(parserAnki.BREAKER_FAILURES):
+            html, _ = await self.fetch([(parserAnki.PROXY_ERROR, None)] * parserAnki.RETRY_ATTEMPTS)
+            self.assertEqual(html, -1)
+        self.assertEqual(parserAnki.get_breaker(HOST)["failures"], 0)
+        self.assertTrue(parserAnki.breaker_allows(HOST))
+
+    async def test_site_errors_open_breaker(self):
+        for _ in range(2):
+            await self.fetch([(parserAnki.RETRYABLE, None)] * parserAnki.RETRY_ATTEMPTS)
+        self.assertEqual(parserAnki.get_breaker(HOST)["failures"], parserAnki.BREAKER_FAILURES)
+        html, _ = await self.fetch([("<html>", {})])
+        self.assertEqual(html, parserAnki.CIRCUIT_OPEN)
+
+    async def test_cancelled_probe_releases_host(self):
+        self.open_breaker()
+        started = asyncio.Event()
+
+        async def hang(*args):
+            started.set()
+            await asyncio.sleep(10)
+
+        with mock.patch.object(parserAnki, "request_page", hang):
+            probe = asyncio.create_task(parserAnki.fetch_with_retry(None, URL))
+            await started.wait()
+            self.assertFalse(parserAnki.breaker_allows(HOST)) # пока идёт проба, остальные ждут
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+        html, _ = await self.fetch([("<html>", {})])
+        self.assertEqual(html, "<html>")
+        self.assertEqual(parserAnki.get_breaker(HOST)["failures"], 0)
+
+    async def test_probe_exception_releases_host(self):
+        self.open_breaker()
+        with self.assertRaises(RuntimeError):
+            await self.fetch(RuntimeError("ошибка"))
+        self.assertFalse(parserAnki.get_breaker(HOST)["probe"])
+        self.assertTrue(parserAnki.breaker_allows(HOST))
+
+    async def request_status(self, status):
+        response = mock.MagicMock(status=status)
+        session = mock.MagicMock()
+        session.get.return_value.__aenter__ = mock.AsyncMock(return_value=response)
+        session.get.return_value.__aexit__ = mock.AsyncMock(return_value=False)
+        parserAnki.sync_proxies(["http://proxy"])
+        html, _ = await parserAnki.request_page(session, URL, "http://proxy")
+        return html
+
+    async def test_proxy_status_is_blamed_on_proxy(self):
+        self.assertEqual(await self.request_status(407), parserAnki.PROXY_ERROR)
+        self.assertEqual(parserAnki.proxies["http://proxy"]["errors"], 1)
+
+    async def test_site_5xx_is_not_blamed_on_proxy(self):
+        for _ in range(parserAnki.PROXY_MAX_ERRORS):
+            self.assertEqual(await self.request_status(503), parserAnki.RETRYABLE)
+        stats = parserAnki.proxies["http://proxy"]
+        self.assertEqual((stats["errors"], stats["quarantined_until"]), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# parserAnki.stream_sizes: каждая страница отдаётся ровно один раз, и при ошибках в любой части
+# скачивания и разбора поток заканчивается, а не ждёт потерянный результат.
+# Запуск: python -m unittest test_parser_stream
+# Сеть не нужна: fetch_with_retry подменяется
+import asyncio
+import concurrent.futures
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import parserAnki
+
+PAGE = ('<input type="radio" id="s41"><label for="s41"><span>41</span></label>'
+        '<input type="radio" id="s42" disabled><label for="s42"><span>42</span></label>')
+TIMEOUT = 5
+
+
+def sneakers(*arts):
+    return [{"art": art, "url": f"https://anki.team/product/{art}"} for art in arts]
+
+
+# Ответы сайта по артикулу в конце url: html, -1 или исключение
+def fake_fetch(responses):
+    async def fetch_with_retry(session, url, page=None, semaphore=None, limiter=None):
+        response = responses[url.rsplit("/", 1)[1]]
+        if isinstance(response, Exception):
+            raise response
+        if isinstance(response, str):
+            return response, {"etag": None, "last_modified": None}
+        return response, None
+    return fetch_with_retry
+
+
+# Пул, у которого упал процесс: все задачи завершаются BrokenProcessPool
+class BrokenPool:
+    def __init__(self):
+        self.shutdowns = []
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        future.set_exception(BrokenProcessPool("процесс упал"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns.append(wait)
+
+
+class StreamSizesTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        with open("bot_settings.json", "w") as f:
+            json.dump({"proxy": None}, f)
+        parserAnki.pages_state.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        parserAnki.pages_state.clear()
+
+    async def collect(self, urls, responses):
+        with mock.patch.object(parserAnki, "fetch_with_retry", fake_fetch(responses)):
+            return await asyncio.wait_for(parserAnki.get_all_sizes(urls, rate=0), TIMEOUT)
+
+    async def test_all_pages_are_returned(self):
+        sizes = await self.collect(sneakers("A1", "A2", "A3"), {"A1": PAGE, "A2": -1, "A3": RuntimeError("сеть")})
+        self.assertEqual(sizes, {"A1": ["41"], "A2": -1, "A3": -1})
+        self.assertEqual(parserAnki.last_run_stats["parsed"], 1)
+        self.assertEqual(parserAnki.last_run_stats["errors"], 2)
+
+    async def test_not_modified_without_stored_sizes(self):
+        sizes = await self.collect(sneakers("A1", "A2"), {"A1": parserAnki.NOT_MODIFIED, "A2": PAGE})
+        self.assertEqual(sizes, {"A1": -1, "A2": ["41"]})
+
+    async def test_hash_error_does_not_hang(self):
+        def fragment_hash(html):
+            if "boom" in html:
+                raise ValueError("плохая страница")
+            return "hash"
+        with mock.patch.object(parserAnki, "fragment_hash", fragment_hash):
+            sizes = await self.collect(sneakers("A1", "A2"), {"A1": "boom", "A2": PAGE})
+        self.assertEqual(sizes, {"A1": -1, "A2": ["41"]})
+
+    async def test_parse_errors_do_not_hang(self):
+        with mock.patch.object(parserAnki, "parse_pages", mock.AsyncMock(side_effect=RuntimeError("пул"))):
+            sizes = await self.collect(sneakers("A1", "A2"), {"A1": PAGE, "A2": PAGE})
+        self.assertEqual(sizes, {"A1": -1, "A2": -1})
+
+    async def test_cancelled_parse_does_not_hang(self):
+        with mock.patch.object(parserAnki, "parse_pages", mock.AsyncMock(side_effect=asyncio.CancelledError)):
+            sizes = await self.collect(sneakers("A1", "A2"), {"A1": PAGE, "A2": PAGE})
+        self.assertEqual(sizes, {"A1": -1, "A2": -1})
+
+    async def test_broken_pool_is_restarted_once(self):
+        broken = BrokenPool()
+        started = []
+        with mock.patch.object(parserAnki, "parse_pool", broken), \
+                mock.patch.object(parserAnki, "start_parse_pool", lambda: started.append(1)):
+            results = await asyncio.gather(*(parserAnki.parse_pages([(art, PAGE)]) for art in ("A1", "A2", "A3")))
+        self.assertEqual(results, [{"A1": ["41"]}, {"A2": ["41"]}, {"A3": ["41"]}])
+        self.assertEqual(started, [1])
+        self.assertEqual(broken.shutdowns, [False])
+
+    async def test_duplicate_art_is_returned_for_each_url(self):
+        urls = sneakers("A1") + [{"art": "A1", "url": "https://anki.team/product/A1"}]
+        results = []
+        with mock.patch.object(parserAnki, "fetch_with_retry", fake_fetch({"A1": PAGE})):
+            async def consume():
+                async for art, value in parserAnki.stream_sizes(urls, rate=0):
+                    results.append((art, value))
+            await asyncio.wait_for(consume(), TIMEOUT)
+        self.assertEqual(len(results), 2)
+
+    async def test_unchanged_page_uses_stored_sizes(self):
+        await self.collect(sneakers("A1"), {"A1": PAGE})
+        sizes = await self.collect(sneakers("A1"), {"A1": PAGE + "<p>реклама</p>"})
+        self.assertEqual(sizes, {"A1": ["41"]})
+        self.assertEqual(parserAnki.last_run_stats["unchanged"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
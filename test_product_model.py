@@ -0,0 +1,44 @@
+# product_model.Product: строка to_blob читается обратно тем же товаром, строки другой версии схемы -
+# как отсутствующий товар.
+# Запуск: python -m unittest test_product_model
+import unittest
+
+import product_model
+import redis_nikix
+
+ROW = (7, "sneaker", "Air Max 90 «Ёлка»", "Китай", "кожа, замша", "демисезон, лето", "Nike", 15990, "DD1234-100",
+       "https://example.com/7.jpg", "0", "https://anki.team/product/7", 1, 12990)
+
+
+class ProductTest(unittest.TestCase):
+    def test_row_fields(self):
+        product = product_model.from_row(ROW)
+        self.assertEqual(product.name, "Air Max 90 «Ёлка»")
+        self.assertEqual(product[0], 7)
+        self.assertEqual(product._replace(price=1).price, 1)
+        self.assertEqual(product._asdict()["art"], "DD1234-100")
+
+    def test_blob_round_trip(self):
+        product = product_model.from_row(ROW)
+        self.assertEqual(product_model.from_blob(product.to_blob()), product)
+
+    def test_blob_round_trip_edge_values(self):
+        product = product_model.Product(2 ** 40, "", "", "", "", "", "🙂", -1, "A", "", "", "", 0, 0)
+        decoded = product_model.from_blob(product.to_blob())
+        self.assertEqual(decoded, product)
+        self.assertIsInstance(decoded.is_drop, int)
+
+    def test_unknown_version_is_missing(self):
+        blob = bytearray(product_model.from_row(ROW).to_blob())
+        blob[0] = product_model.BLOB_VERSION + 1
+        self.assertIsNone(product_model.from_blob(bytes(blob)))
+
+    def test_decode_products_skips_missing_and_old(self):
+        good = product_model.from_row(ROW)
+        old = bytearray(good.to_blob())
+        old[0] = 0
+        self.assertEqual(redis_nikix.decode_products([None, good.to_blob(), bytes(old), b""]), [good])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# Товар из sqlite, из redis и из каталога в памяти - один и тот же product_model.Product с теми же типами полей
+# (раньше из redis is_drop приходил строкой "0", а из базы числом 0).
+# Запуск: python -m unittest test_product_sources
+# База создаётся во временной папке; нужен локальный redis, используется отдельная база 14, она очищается
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import catalog_engine
+import product_model
+import redis_nikix
+from redis_test_case import RedisTestCase, import_main
+
+main = import_main()
+import database # database сам импортирует main, поэтому после import_main
+
+CSV = ("type,name,maker,material,season,brand,price,art,photo_url,channel_url,anki_url,is_drop,drop_price\n"
+       "sneaker,Air Max,Китай,Кожа:Замша,лето:демисезон,Nike,15990,A1,p1,0,u1,1,12990\n"
+       "sneaker,Samba,Китай,замша,лето,Adidas,9990,A2,p2,0,u2,,\n")
+
+
+class ProductSourcesTest(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.patch(database, "DATABASE_PATH", os.path.join(self.tmp.name, "test.db"))
+        self.patch(main, "send_admin_message", mock.AsyncMock())
+        await database.open_db()
+        await database.init_db()
+        csv_path = os.path.join(self.tmp.name, "products.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write(CSV)
+        await database.upload_products(csv_path)
+        catalog_engine.revision = None
+
+    async def asyncTearDown(self):
+        await database.close_db()
+        await super().asyncTearDown()
+
+    async def test_same_product_from_every_source(self):
+        from_db = await database.fetch_products("all")
+        self.assertTrue(all(isinstance(product, product_model.Product) for product in from_db))
+        await redis_nikix.rebuild_catalog(from_db)
+        await catalog_engine.reload()
+        for product in from_db:
+            self.assertEqual(catalog_engine.get_product(product.art), product)
+            self.assertEqual(await database.fetch_product_by_art(product.art), product)
+
+    async def test_field_types(self):
+        drop = await database.fetch_product_by_art("A1")
+        plain = await database.fetch_product_by_art("A2")
+        self.assertEqual((drop.is_drop, drop.price, drop.drop_price), (1, 15990, 12990))
+        self.assertEqual((plain.is_drop, plain.drop_price), (0, 0))
+        self.assertEqual((drop.material, drop.season), ("кожа, замша", "лето, демисезон"))
+        await redis_nikix.rebuild_catalog([drop, plain])
+        await catalog_engine.reload()
+        self.assertIs(type(catalog_engine.get_product("A2").is_drop), int)
+        self.assertEqual([product.art for product in catalog_engine.get_products(1, facet="drop")], ["A1"])
+
+
+if __name__ == '__main__':
+    unittest.main()